@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from caac_site import SiteFaults, SiteScale, SiteServer, generate_site
+
+from caac_package.crawler import Crawler
+from caac_package.project_config import ProjectConfig
+
+parser = argparse.ArgumentParser(description="Benchmark Crawler.run() against a local synthetic CAAC site.")
+parser.add_argument("--universities", type=int, default=SiteScale.universities)
+parser.add_argument("--departments-per-university", type=int, default=SiteScale.departments_per_university)
+parser.add_argument("--admittees-per-department", type=int, default=SiteScale.admittees_per_department)
+parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each response.")
+parser.add_argument("--latency-jitter", type=float, default=0.0, help="Extra random seconds before each response.")
+parser.add_argument("--error-rate", type=float, default=0.0, help="The probability of dropping a connection.")
+parser.add_argument("--rate-limit", type=float, default=0.0, help="Max requests per second. (0 for unlimited)")
+parser.add_argument("--workers", type=int, default=ProjectConfig.CRAWLER_WORKER_NUM, help="Crawler worker threads.")
+parser.add_argument("--output", default="", help="Also write the report into this JSON file.")
+args = parser.parse_args()
+
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    site_dir = Path(tmp_dir) / "site"
+    scale = SiteScale(
+        universities=args.universities,
+        departments_per_university=args.departments_per_university,
+        admittees_per_department=args.admittees_per_department,
+    )
+    site_stats = generate_site(site_dir, scale)
+
+    # crawled files and the DB go into the temporary directory
+    ProjectConfig.DATA_DIR = Path(tmp_dir) / "data"
+    ProjectConfig.CRAWLER_WORKER_NUM = args.workers
+
+    faults = SiteFaults(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+    )
+
+    with SiteServer(site_dir, faults) as server:
+        crawler = Crawler(113, "apply_sieve", f"{server.base_url}collegeList.htm")
+
+        t_start = time.perf_counter()
+        crawler.fetch_and_save_department_applys(
+            crawler.fetch_and_save_department_lists(crawler.fetch_and_save_college_list())
+        )
+        t_crawled = time.perf_counter()
+        crawler.generate_db()
+        t_end = time.perf_counter()
+
+    served = server.stats.to_dict()
+    report = {
+        "site": {**site_stats, **vars(scale)},
+        "faults": vars(faults),
+        "workers": args.workers,
+        "server": served,
+        "failed_urls": len(crawler.failed_urls),
+        "crawl_seconds": t_crawled - t_start,
+        "generate_db_seconds": t_end - t_crawled,
+        "total_seconds": t_end - t_start,
+        "pages_per_second": served["responses"] / max(t_crawled - t_start, 1e-9),
+        "bytes_per_second": served["bytes"] / max(t_crawled - t_start, 1e-9),
+    }
+
+print(json.dumps(report, indent=4, ensure_ascii=False))
+
+if args.output:
+    Path(args.output).write_text(json.dumps(report, indent=4, ensure_ascii=False), encoding="utf-8")
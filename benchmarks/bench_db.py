@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from caac_site import SiteScale, generate_site
+
+from caac_package.crawler import Crawler
+from caac_package.lookup_db import LookupDb
+from caac_package.project_config import ProjectConfig
+
+parser = argparse.ArgumentParser(description="Benchmark DB generation and lookups on synthetic crawled data.")
+parser.add_argument(
+    "--scales",
+    default="1,10,100",
+    help="Scales of a real year's size to be benchmarked. (separate by commas)",
+)
+parser.add_argument("--lookup-num", type=int, default=200, help="How many IDs are looked up in each query benchmark.")
+parser.add_argument(
+    "--output",
+    default=datetime.datetime.now().strftime("bench_db_%Y%m%d_%H%M%S.json"),
+    help="The JSON file to record results.",
+)
+parser.add_argument("--compare", default="", help="A previous result JSON file to be compared with.")
+args = parser.parse_args()
+
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
+
+
+def timed(func: Callable[[], Any]) -> tuple[float, Any]:
+    t_start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - t_start, result
+
+
+def get_git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def bench_scale(scale_factor: float, tmp_dir: Path) -> dict[str, Any]:
+    ProjectConfig.DATA_DIR = tmp_dir / f"data_{scale_factor:g}"
+    year, apply_stage = 113, "apply_sieve"
+
+    scale = SiteScale().scaled(scale_factor)
+    t_generate_site, site_stats = timed(
+        lambda: generate_site(ProjectConfig.get_crawled_result_dir(year, apply_stage), scale)
+    )
+    logger.warning(f"Scale {scale_factor:g}x: {site_stats} (generated in {t_generate_site:.1f}s)")
+
+    crawler = Crawler(year, apply_stage, "http://127.0.0.1/collegeList.htm")
+    db_file = ProjectConfig.get_crawled_db_file(year, apply_stage)
+
+    timings: dict[str, float] = {}
+    timings["generate_db"], _ = timed(crawler.generate_db)
+    timings["lookup_db_init"], lookup = timed(lambda: LookupDb(db_file))
+
+    assert lookup.conn
+    rnd = random.Random(0)
+    admission_ids = [row[0] for row in lookup.conn.execute("SELECT DISTINCT admission_id FROM qualified")]
+    admission_ids = rnd.sample(admission_ids, min(args.lookup_num, len(admission_ids)))
+    department_num = min(args.lookup_num // 40 or 1, len(lookup.department_map))
+    department_ids = rnd.sample(sorted(lookup.department_map), department_num)
+
+    timings["lookup_by_admission_ids"], _ = timed(lambda: lookup.lookup_by_admission_ids(admission_ids))
+    timings["lookup_by_department_ids"], lookup_result = timed(lambda: lookup.lookup_by_department_ids(department_ids))
+    lookup_result = dict(sorted(lookup_result.items()))
+
+    lookup_args = argparse.Namespace(department_ids=",".join(department_ids))
+    for write_out_method in (
+        "write_out_sieve_result",
+        "write_out_sieve_result_nthu_ee",
+        "write_out_entrance_result",
+    ):
+        output_file = str(tmp_dir / f"{write_out_method}.xlsx")
+        timings[write_out_method], _ = timed(
+            lambda: getattr(lookup, write_out_method)(output_file, lookup_result, lookup_args)
+        )
+
+    return {
+        "scale": scale_factor,
+        "site": site_stats,
+        "db_bytes": db_file.stat().st_size,
+        "lookup_admission_ids": len(admission_ids),
+        "lookup_department_ids": len(department_ids),
+        "lookup_result_rows": len(lookup_result),
+        "seconds": timings,
+    }
+
+
+report: dict[str, Any] = {
+    "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    "git_revision": get_git_revision(),
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "results": [],
+}
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    for scale_factor in map(float, filter(None, args.scales.split(","))):
+        report["results"].append(bench_scale(scale_factor, Path(tmp_dir)))
+        Path(args.output).write_text(json.dumps(report, indent=4, ensure_ascii=False), encoding="utf-8")
+
+print(json.dumps(report, indent=4, ensure_ascii=False))
+
+if args.compare:
+    previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+    previous_results = {result["scale"]: result for result in previous["results"]}
+
+    print(f"\nCompared with {args.compare} ({previous.get('git_revision', '')}):")
+    for result in report["results"]:
+        if not (previous_result := previous_results.get(result["scale"])):
+            continue
+        for name, seconds in result["seconds"].items():
+            if previous_seconds := previous_result["seconds"].get(name):
+                print(
+                    f"{result['scale']:>6g}x {name:<35} {previous_seconds:>9.3f}s -> {seconds:>9.3f}s"
+                    + f" ({seconds / previous_seconds:.2f}x)"
+                )
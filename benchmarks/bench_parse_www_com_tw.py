@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+import base64
+import os
+import re
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TypeVar
+
+from loguru import logger
+from pyquery import PyQuery as pq
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+import caac_package.functions as caac_funcs
+from caac_package.cross_records import people_to_dict
+
+_R = TypeVar("_R")
+
+parser = argparse.ArgumentParser(description="Benchmark parse_www_com_tw() on saved cross-check pages.")
+parser.add_argument(
+    "pages",
+    nargs="*",
+    help="Saved cross-check pages. (ex: data/crawler_113/cross_cache/*.html)",
+)
+parser.add_argument(
+    "--synthetic-rows",
+    type=int,
+    default=2000,
+    help="The number of applicants of the synthetic page used when no page is given.",
+)
+parser.add_argument("--repeat", type=int, default=3, help="How many times each page is parsed.")
+args = parser.parse_args()
+
+
+def parse_www_com_tw_pyquery(content: str = "") -> dict[str, Any]:
+    """The previous PyQuery-based implementation, kept as the reference of correctness and speed."""
+    people_result: dict[str, Any] = {}
+
+    admission_id_regex = re.compile(r"\b(\d{8})\b")
+    department_id_regex = re.compile(r"_(\d{6,7})_")
+
+    content = content.replace("\r", "").replace("\n", " ")
+    person_rows = pq(content)("#mainContent > table:first > tbody > tr")
+
+    for person_row in person_rows.items():
+        html = person_row.outer_html()
+
+        if not (matches := re.search(r'data:image/[^;]+;base64,[^\'"]*', str(html))):
+            continue
+
+        admission_id = caac_funcs.ocr_data_uri(matches.group(0))
+        admission_id = re.sub(r"[^0-9a-zA-Z]+", "", admission_id)
+
+        if not admission_id_regex.match(admission_id):
+            continue
+
+        person_name = str(person_row("td:nth-child(4)").text()).strip()
+        person_result: dict[str, dict[str, Any]] = {admission_id: {"_name": person_name}}
+
+        apply_table_rows = person_row("td:nth-child(5) table:first > tbody > tr")
+        for apply_table_row in apply_table_rows.items():
+            if not (find_department_id := department_id_regex.search(str(apply_table_row.outer_html()))):
+                continue
+
+            department_id = str(find_department_id.group(1))
+            department_name = str(apply_table_row("td:nth-child(2)").text()).strip()
+            apply_state = str(apply_table_row("td:nth-child(3)").text()).strip()
+
+            person_result[admission_id][department_id] = {
+                "_name": department_name,
+                "is_dispatched": "分發錄取" in str(apply_table_row.outer_html()),
+                "apply_state": caac_funcs.normalize_apply_state_c2e(apply_state),
+            }
+
+        people_result.update(person_result)
+
+    return people_result
+
+
+def generate_synthetic_page(rows: int) -> str:
+    """Generate a page which looks like a www.com.tw cross-check page."""
+    dispatched_img = '<img alt="分發錄取" src="/icon.png">'
+
+    person_rows: list[str] = []
+    for row in range(rows):
+        admission_id = f"{11000000 + row:08d}"
+        data_uri = "data:image/png;base64," + base64.b64encode(admission_id.encode()).decode()
+        apply_rows = "".join(
+            f'<tr><td><a href="/cross/check_{department_id:06d}_NO_0_113_0_3.html">{apply}</a></td>'
+            + f"<td>國立清華大學 電機工程學系 (乙組)</td><td>{'正' if apply % 2 else '備'}取 {apply}</td>"
+            + f"<td>{dispatched_img if apply == 0 else ''}</td></tr>"
+            for apply, department_id in enumerate(range(11312 + row % 7, 11312 + row % 7 + 6))
+        )
+        person_rows.append(
+            f'<tr><td>{row}</td><td><img src="{data_uri}"></td><td>學測</td><td>考生 {row}</td>'
+            + f"<td><table><tbody>{apply_rows}</tbody></table></td></tr>"
+        )
+
+    return (
+        '<html><head><title>cross</title></head><body><div id="mainContent">'
+        + f"<table><tbody>{''.join(person_rows)}</tbody></table>"
+        + '</div><div id="footer"></div></body></html>'
+    )
+
+
+def fake_ocr_factory() -> Callable[[str], str]:
+    """Make an OCR replacement so that only the parsing is measured."""
+    admission_ids: dict[str, str] = {}
+
+    def fake_ocr(data_uri: str) -> str:
+        if data_uri not in admission_ids:
+            decoded = base64.b64decode(data_uri.partition(",")[2] + "==").decode(errors="ignore")
+            admission_ids[data_uri] = decoded if re.fullmatch(r"\d{8}", decoded) else f"{len(admission_ids):08d}"
+        return admission_ids[data_uri]
+
+    return fake_ocr
+
+
+def time_parser(parse: Callable[[str], _R], content: str) -> tuple[float, _R]:
+    # this also warms up caches like interned strings
+    result = parse(content)
+    t_start = time.perf_counter()
+    for _ in range(args.repeat):
+        result = parse(content)
+    return (time.perf_counter() - t_start) / args.repeat, result
+
+
+logger.remove()
+caac_funcs.ocr_data_uri = fake_ocr_factory()
+
+if args.pages:
+    pages = {page: Path(page).read_text(encoding="utf-8") for page in args.pages}
+else:
+    pages = {f"synthetic ({args.synthetic_rows} rows)": generate_synthetic_page(args.synthetic_rows)}
+
+print(f"{'page':<50} {'bytes':>10} {'pyquery (s)':>12} {'lxml (s)':>10} {'speedup':>8} same")
+for name, content in pages.items():
+    t_pyquery, result_pyquery = time_parser(parse_www_com_tw_pyquery, content)
+    t_lxml, result_lxml = time_parser(caac_funcs.parse_www_com_tw, content)
+    print(
+        f"{name[-50:]:<50} {len(content.encode()):>10} {t_pyquery:>12.4f} {t_lxml:>10.4f}"
+        + f" {t_pyquery / max(t_lxml, 1e-9):>7.1f}x {result_pyquery == people_to_dict(result_lxml)}"
+    )
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from caac_site import SiteFaults, SiteScale, SiteServer, generate_site
+
+from caac_package.crawler import Crawler
+from caac_package.project_config import ProjectConfig
+from caac_package.work_queue import WorkQueue
+
+YEAR, APPLY_STAGE = 113, "apply_sieve"
+
+
+def run_worker(data_dir: Path, index_url: str, worker_id: str, thread_num: int, visibility_timeout: float) -> None:
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    ProjectConfig.DATA_DIR = data_dir
+    ProjectConfig.CRAWLER_WORKER_NUM = thread_num
+
+    crawler = Crawler(YEAR, APPLY_STAGE, index_url)
+    queue = WorkQueue(ProjectConfig.get_crawl_queue_file(YEAR, APPLY_STAGE), visibility_timeout=visibility_timeout)
+    crawler.run_queue_worker(queue, worker_id, poll_interval=0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crawl a local synthetic CAAC site with several worker processes sharing a work queue."
+    )
+    parser.add_argument("--universities", type=int, default=SiteScale.universities)
+    parser.add_argument("--departments-per-university", type=int, default=SiteScale.departments_per_university)
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes.")
+    parser.add_argument("--threads", type=int, default=4, help="Threads of each worker process.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds to wait before each response.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="The probability of dropping a connection.")
+    parser.add_argument(
+        "--kill-one-after",
+        type=float,
+        default=0.0,
+        help="Kill a worker process after this many seconds to see its leases taken over. (0 for never)",
+    )
+    parser.add_argument("--visibility-timeout", type=float, default=5.0)
+    parser.add_argument("--output", default="", help="Also write the report into this JSON file.")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        site_dir = Path(tmp_dir) / "site"
+        scale = SiteScale(universities=args.universities, departments_per_university=args.departments_per_university)
+        site_stats = generate_site(site_dir, scale)
+
+        data_dir = ProjectConfig.DATA_DIR = Path(tmp_dir) / "data"
+        faults = SiteFaults(latency=args.latency, error_rate=args.error_rate)
+
+        with SiteServer(site_dir, faults) as server:
+            index_url = f"{server.base_url}collegeList.htm"
+            crawler = Crawler(YEAR, APPLY_STAGE, index_url)
+            queue = WorkQueue(ProjectConfig.get_crawl_queue_file(YEAR, APPLY_STAGE))
+            crawler.seed_queue(queue)
+
+            t_start = time.perf_counter()
+            processes = [
+                multiprocessing.Process(
+                    target=run_worker,
+                    args=(data_dir, index_url, f"worker-{index}", args.threads, args.visibility_timeout),
+                )
+                for index in range(args.processes)
+            ]
+            for process in processes:
+                process.start()
+
+            if args.kill_one_after:
+                time.sleep(args.kill_one_after)
+                processes[0].kill()
+
+            for process in processes:
+                process.join()
+            t_crawled = time.perf_counter()
+
+        crawler.generate_db()
+
+        conn = sqlite3.connect(ProjectConfig.get_crawled_db_file(YEAR, APPLY_STAGE))
+        db_counts = {
+            "departments": conn.execute("SELECT COUNT(DISTINCT department_id) FROM qualified").fetchone()[0],
+            "qualified": conn.execute("SELECT COUNT(*) FROM qualified").fetchone()[0],
+        }
+        conn.close()
+
+        report = {
+            "site": site_stats,
+            "processes": args.processes,
+            "threads": args.threads,
+            "killed_one_after": args.kill_one_after,
+            "queue": queue.count_states(),
+            "failed_urls": queue.get_failed_urls(),
+            "server": server.stats.to_dict(),
+            "db": db_counts,
+            "complete": db_counts == {"departments": site_stats["departments"], "qualified": site_stats["qualified"]},
+            "crawl_seconds": t_crawled - t_start,
+        }
+
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4, ensure_ascii=False), encoding="utf-8")
@@ -0,0 +1,281 @@
+"""
+A synthetic CAAC site for benchmarks.
+
+The generated tree looks like what `caac_package.crawler.Crawler` crawls:
+
+    collegeList.htm             links to "web/{university_id}.htm" as "(011)國立清華大學"
+    web/{university_id}.htm     links to "common/{department_id}.htm" and "extra/{department_id}.htm"
+    web/common/*.htm            "(011312)電機工程學系(甲組)" followed by admission IDs
+    web/extra/*.htm             the same but for "［離島外加名額］" departments
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+UNIVERSITY_NAMES = [
+    "國立臺灣大學",
+    "國立臺灣師範大學",
+    "國立中興大學",
+    "國立成功大學",
+    "國立政治大學",
+    "國立清華大學",
+    "國立陽明交通大學",
+    "國立中央大學",
+    "國立中山大學",
+    "國立中正大學",
+]
+
+DEPARTMENT_NAMES = [
+    "中國文學系",
+    "外國語文學系",
+    "歷史學系",
+    "數學系",
+    "物理學系",
+    "化學系",
+    "化學工程學系",
+    "機械工程學系",
+    "電機工程學系",
+    "資訊工程學系",
+    "電子工程學系",
+    "醫學系",
+]
+
+DEPARTMENT_GROUPS = ["", "(甲組)", "(乙組)"]
+
+
+@dataclass
+class SiteScale:
+    universities: int = 70
+    departments_per_university: int = 30
+    admittees_per_department: int = 40
+    extra_department_ratio: float = 0.05
+    """The ratio of departments which are "［離島外加名額］" ones."""
+
+    def scaled(self, factor: float) -> SiteScale:
+        """Scale the site in terms of the number of departments."""
+        return SiteScale(
+            universities=self.universities,
+            departments_per_university=max(1, round(self.departments_per_university * factor)),
+            admittees_per_department=self.admittees_per_department,
+            extra_department_ratio=self.extra_department_ratio,
+        )
+
+
+def _html(title: str, body: str) -> str:
+    return f'<html><head><meta charset="utf-8"><title>{title}</title></head><body>{body}</body></html>'
+
+
+def generate_site(root: str | Path, scale: SiteScale | None = None, *, seed: int = 0) -> dict[str, int]:
+    """
+    Generate a synthetic CAAC result tree into the root directory.
+
+    @return statistics of the generated site
+    """
+    root = Path(root)
+    scale = scale or SiteScale()
+    rnd = random.Random(seed)
+
+    # each applicant applies about 3 departments
+    applicant_num = max(1, scale.universities * scale.departments_per_university * scale.admittees_per_department // 3)
+    applicants = [f"{10000000 + index * 7:08d}" for index in range(applicant_num)]
+
+    stats = {"pages": 0, "bytes": 0, "departments": 0, "qualified": 0}
+
+    def write(path: str, content: str) -> None:
+        filepath = root / path
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        data = content.encode("utf-8")
+        filepath.write_bytes(data)
+        stats["pages"] += 1
+        stats["bytes"] += len(data)
+
+    college_links: list[str] = []
+    for university_index in range(scale.universities):
+        university_id = f"{university_index + 1:03d}"
+        university_name = (
+            UNIVERSITY_NAMES[university_index]
+            if university_index < len(UNIVERSITY_NAMES)
+            else f"私立第{university_index + 1}大學"
+        )
+        college_links.append(f'<li><a href="web/{university_id}.htm">({university_id}){university_name}</a></li>')
+
+        department_links: list[str] = []
+        for department_index in range(scale.departments_per_university):
+            department_id = f"{university_id}{department_index + 1:03d}"
+            department_name = (
+                DEPARTMENT_NAMES[department_index % len(DEPARTMENT_NAMES)]
+                + DEPARTMENT_GROUPS[department_index // len(DEPARTMENT_NAMES) % len(DEPARTMENT_GROUPS)]
+            )
+            folder = "common"
+            if rnd.random() < scale.extra_department_ratio:
+                folder = "extra"
+                department_name += "［離島外加名額］"
+
+            department_links.append(
+                f'<tr><td><a href="{folder}/{department_id}.htm">({department_id}){department_name}</a></td></tr>'
+            )
+
+            admittees = sorted(rnd.sample(applicants, min(scale.admittees_per_department, len(applicants))))
+            admittee_rows = "".join(
+                f"<tr><td>{index}</td><td>{admittee}</td></tr>" for index, admittee in enumerate(admittees, 1)
+            )
+            write(
+                f"web/{folder}/{department_id}.htm",
+                _html(
+                    department_name,
+                    f"<h2>({department_id}){department_name}</h2><table>{admittee_rows}</table>",
+                ),
+            )
+            stats["departments"] += 1
+            stats["qualified"] += len(admittees)
+
+        write(
+            f"web/{university_id}.htm",
+            _html(
+                university_name,
+                f"<h2>({university_id}){university_name}</h2><table>{''.join(department_links)}</table>",
+            ),
+        )
+
+    write("collegeList.htm", _html("校系分則", f"<ul>{''.join(college_links)}</ul>"))
+
+    return stats
+
+
+@dataclass
+class SiteFaults:
+    latency: float = 0.0
+    """Seconds to wait before responding."""
+    latency_jitter: float = 0.0
+    """Extra random seconds (uniformly distributed) to wait before responding."""
+    error_rate: float = 0.0
+    """The probability that a connection is dropped without any response."""
+    rate_limit: float = 0.0
+    """Max requests per second before responding 429. (0 for unlimited)"""
+
+
+@dataclass
+class SiteStats:
+    requests: int = 0
+    responses: int = 0
+    bytes: int = 0
+    dropped: int = 0
+    rate_limited: int = 0
+    paths: dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "responses": self.responses,
+            "bytes": self.bytes,
+            "dropped": self.dropped,
+            "rate_limited": self.rate_limited,
+            "unique_paths": len(self.paths),
+            # requests which are not the first one of their paths
+            "retries": self.requests - len(self.paths),
+        }
+
+
+class SiteServer:
+    """Serve a generated site from a local HTTP server with injectable latency, errors and rate limits."""
+
+    def __init__(self, root: str | Path, faults: SiteFaults | None = None, *, seed: int = 0) -> None:
+        self.root = Path(root)
+        self.faults = faults or SiteFaults()
+        self.stats = SiteStats()
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+
+        server = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            def __init__(self, *args: Any, **kwargs: Any) -> None:
+                super().__init__(*args, directory=str(server.root), **kwargs)
+
+            def do_GET(self) -> None:
+                verdict = server._before_response(self.path)
+                if verdict == "rate_limited":
+                    self.send_error(429, "Too Many Requests")
+                elif verdict == "dropped":
+                    # the client sees the connection closed without any response
+                    self.close_connection = True
+                else:
+                    super().do_GET()
+
+            def send_head(self) -> Any:
+                f = super().send_head()
+                if f is not None and hasattr(f, "fileno"):
+                    with server._lock:
+                        server.stats.responses += 1
+                        server.stats.bytes += Path(f.name).stat().st_size
+                return f
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _before_response(self, path: str) -> str:
+        """Apply faults for a request. Returns "ok", "rate_limited" or "dropped"."""
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.paths[path] = self.stats.paths.get(path, 0) + 1
+
+            if self.faults.rate_limit:
+                now = time.monotonic()
+                if now - self._window_start >= 1:
+                    self._window_start, self._window_requests = now, 0
+                self._window_requests += 1
+                if self._window_requests > self.faults.rate_limit:
+                    self.stats.rate_limited += 1
+                    rate_limited = True
+                else:
+                    rate_limited = False
+            else:
+                rate_limited = False
+
+            dropped = not rate_limited and self._random.random() < self.faults.error_rate
+            if dropped:
+                self.stats.dropped += 1
+
+            delay = self.faults.latency + self._random.uniform(0, self.faults.latency_jitter)
+
+        if delay:
+            time.sleep(delay)
+
+        if rate_limited:
+            return "rate_limited"
+        if dropped:
+            return "dropped"
+        return "ok"
+
+    def start(self) -> SiteServer:
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> SiteServer:
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
@@ -0,0 +1,3 @@
+@echo off
+
+python "%~dp0caac.py" %*
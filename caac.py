@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+import os
+import sys
+
+sys.path.append(os.path.dirname(__file__))
+from caac_package.cli import main
+
+if __name__ == "__main__":
+    main()
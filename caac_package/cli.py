@@ -0,0 +1,690 @@
+"""
+The `caac` command.
+
+Heavy modules (cloudscraper, pyquery, xlsxwriter, pytesseract, pyppeteer, ...) are only imported
+by the subcommand which needs them, so that the command starts fast.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import re
+import sys
+import time
+from collections.abc import Sequence
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from .metrics import METRICS, profiled
+from .project_config import ProjectConfig
+from .year import Year
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from .crawler import Crawler
+    from .lookup_db import LookupDb
+
+APPLY_STAGES = ("apply_sieve", "apply_entrance")
+
+
+def extract_year_from_url(url: str) -> int:
+    """
+    從 CAAC 的網址中提取年份。
+    ex: https://.../apply113/... → 113 (民國 113 年)
+    """
+    match = re.search(r"/apply(\d{3})/", url)
+    if not match:
+        logger.error(f"無法從 URL 提取年份：{url}")
+        raise ValueError("URL 中找不到年份資訊")
+
+    tw_year_abbreviated = int(match.group(1))
+    logger.info(f"從 URL 提取年份：民國 {tw_year_abbreviated} 年")
+    return tw_year_abbreviated
+
+
+def read_ids(ids: str, id_file: str) -> list[str]:
+    """Read unique IDs from a comma-separated string, or from the file if the string is "@file"."""
+    from .functions import can_be_int, unique
+
+    if ids == "@file":
+        with open(id_file) as f:
+            # trim spaces and filter out those are not integers
+            items = list(filter(can_be_int, map(str.strip, f.read().split())))
+    else:
+        items = ids.split(",")
+
+    return list(unique(items, clear=True))
+
+
+def get_output_filepath(output: str) -> str:
+    return output if os.path.splitext(output)[1].lower() == ".xlsx" else f"{output}.xlsx"
+
+
+def get_year(args: argparse.Namespace) -> int:
+    """Get the year from the arguments, or detect it from the crawled data."""
+    return args.year or ProjectConfig.detect_crawled_year()
+
+
+def create_crawler(args: argparse.Namespace) -> Crawler:
+    from .crawler import Crawler
+
+    try:
+        year = args.year or extract_year_from_url(args.project_index_url)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    return Crawler(year, args.stage, args.project_index_url)
+
+
+def command_crawl(args: argparse.Namespace) -> Crawler:
+    crawler = create_crawler(args)
+    crawler.run(show_message=True)
+
+    return crawler
+
+
+def command_crawl_all(args: argparse.Namespace) -> None:
+    from .crawl_orchestrator import CrawlBudget, CrawlOrchestrator
+    from .crawler import Crawler
+
+    if unknown_stages := {stage for stage, _ in args.crawl} - set(APPLY_STAGES):
+        logger.error(f"Unknown stages: {unknown_stages}")
+        sys.exit(1)
+
+    budget = CrawlBudget(args.max_concurrency, args.max_bandwidth)
+
+    try:
+        crawlers = [
+            Crawler(extract_year_from_url(project_index_url), stage, project_index_url, budget=budget)
+            for stage, project_index_url in args.crawl
+        ]
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    failed_urls = CrawlOrchestrator(crawlers, db_build_worker_num=args.db_build_workers).run()
+
+    for crawl_name, urls in failed_urls.items():
+        if urls:
+            logger.warning(f"[{crawl_name}] {len(urls)} URLs failed completely.")
+
+
+def command_crawl_queue(args: argparse.Namespace) -> None:
+    import socket
+
+    from .work_queue import WorkQueue
+
+    crawler = create_crawler(args)
+    queue_file = ProjectConfig.get_crawl_queue_file(crawler.year, args.stage)
+
+    if args.action == "seed":
+        # a new crawl starts from an empty queue
+        queue_file.unlink(missing_ok=True)
+
+    queue = WorkQueue(queue_file, visibility_timeout=args.visibility_timeout)
+
+    if args.action == "seed":
+        crawler.seed_queue(queue)
+        logger.info(f"Crawl queue is seeded: {queue_file}")
+    elif args.action == "work":
+        crawler.run_queue_worker(queue, args.worker_id or f"{socket.gethostname()}:{os.getpid()}")
+
+    logger.info(f"Crawl queue: {queue.count_states()}")
+    if failed_urls := queue.get_failed_urls():
+        logger.warning(f"{len(failed_urls)} URLs failed completely: {failed_urls}")
+
+
+def command_watch(args: argparse.Namespace) -> None:
+    import subprocess
+
+    from .release_watcher import ReleaseWatcher
+
+    def notify(crawler: Crawler, db_file: Path) -> None:
+        if not args.notify_command:
+            return
+        env = {
+            **os.environ,
+            "CAAC_YEAR": str(crawler.year),
+            "CAAC_STAGE": crawler.apply_stage,
+            "CAAC_DB_FILE": str(db_file),
+            "CAAC_FAILED_URL_NUM": str(len(crawler.failed_urls)),
+        }
+        if (returncode := subprocess.run(args.notify_command, shell=True, env=env).returncode) != 0:
+            logger.error(f"The notify command exits with {returncode}: {args.notify_command}")
+
+    watcher = ReleaseWatcher(create_crawler(args), interval=args.interval, jitter=args.jitter, on_ready=notify)
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        logger.info("Stop watching.")
+
+
+def command_build_db(args: argparse.Namespace) -> None:
+    from .crawler import Crawler
+
+    crawler = Crawler(get_year(args), args.stage, "")
+    crawler.generate_db()
+
+
+def command_lookup(args: argparse.Namespace, lookup: LookupDb | None = None) -> None:
+    from .lookup_db import NTHU_EE_ORDER_RULES, LookupDb
+
+    result_filepath = get_output_filepath(args.output)
+
+    if lookup is None:
+        lookup = LookupDb(ProjectConfig.get_crawled_db_file(get_year(args), args.stage))
+
+    admission_ids = read_ids(args.admission_ids, "admission_ids.txt") if args.admission_ids else []
+
+    # names are resolved into department IDs
+    if args.department_names:
+        resolved_ids = [
+            department_id
+            for name in filter(None, map(str.strip, args.department_names.split(",")))
+            for department_id in lookup.search(name, limit=None)
+        ]
+        logger.info(f"Department names are resolved into: {resolved_ids}")
+        department_ids = read_ids(args.department_ids, "department_ids.txt") if args.department_ids else []
+        args.department_ids = ",".join([*department_ids, *resolved_ids])
+
+    department_ids = read_ids(args.department_ids, "department_ids.txt") if args.department_ids else []
+    # writers may need looked up department IDs even if they are read from a file
+    args.department_ids = ",".join(department_ids)
+
+    # the "nthu_ee" format does not show the looked up departments, and shows 清大電機 as the last one
+    is_nthu_ee = args.output_format == "nthu_ee"
+
+    # do lookup, whose results are sorted by admission IDs (ascending) already
+    results: dict[str, list[str]] = lookup.query(  # {"准考證號": ["系所編號", ...], ...}
+        admission_ids=admission_ids,
+        qualified_department_ids=department_ids,
+        exclude_department_ids=department_ids if is_nthu_ee else (),
+        order_rules=NTHU_EE_ORDER_RULES if is_nthu_ee else (),
+    )
+
+    # delete the old xlsx file
+    if os.path.isfile(result_filepath):
+        os.remove(result_filepath)
+
+    # write result to a xlsx file
+    output_format = args.output_format
+    output_format_prefixed = f"_{output_format}" if output_format else ""
+    stage_name = "sieve" if args.stage == "apply_sieve" else "entrance"
+    write_out_method = f"write_out_{stage_name}_result{output_format_prefixed}"
+    if not hasattr(lookup, write_out_method):
+        raise Exception(f"Unknown option: --output-format={output_format}")
+    getattr(lookup, write_out_method)(result_filepath, results, args)
+
+    print(results)
+
+
+def command_search(args: argparse.Namespace) -> None:
+    from .lookup_db import LookupDb
+
+    lookup = LookupDb(ProjectConfig.get_crawled_db_file(get_year(args), args.stage))
+
+    for query in args.queries:
+        print(f"{query}:")
+        for found_id, name in lookup.search(query, args.kind, args.limit).items():
+            print(f"    {found_id}  {name}")
+
+
+def command_run(args: argparse.Namespace) -> None:
+    from .lookup_db import LookupDb
+
+    if not args.targeted:
+        crawler = command_crawl(args)
+
+        # the DB is only loaded once for the lookup
+        command_lookup(args, LookupDb(ProjectConfig.get_crawled_db_file(crawler.year, args.stage)))
+        return
+
+    if not args.department_ids:
+        logger.error("--targeted needs --department-ids")
+        sys.exit(1)
+
+    crawler = create_crawler(args)
+    full_crawl = crawler.run_targeted(read_ids(args.department_ids, "department_ids.txt"), show_message=True)
+
+    # look up the partial DB while the full crawl continues in the background
+    partial_output = os.path.splitext(get_output_filepath(args.output))[0] + "_partial.xlsx"
+    command_lookup(
+        argparse.Namespace(**{**vars(args), "output": partial_output}),
+        LookupDb(ProjectConfig.get_crawled_partial_db_file(crawler.year, args.stage)),
+    )
+    logger.info(f"Partial result is written to: {partial_output}. Waiting for the full crawl...")
+
+    full_crawl.result()
+    command_lookup(args, LookupDb(ProjectConfig.get_crawled_db_file(crawler.year, args.stage)))
+
+
+def command_cross(args: argparse.Namespace) -> None:
+    import asyncio
+
+    from .cross_fetcher import CrossPageCache, get_cross_url
+    from .cross_pipeline import CrossPipeline
+    from .cross_report import fix_pyppeteer, write_out_cross_result
+    from .cross_store import CrossStore
+    from .department_resolver import DepartmentResolver
+
+    year = Year.taiwanize(get_year(args))
+    result_filepath = get_output_filepath(args.output)
+    page_cache = CrossPageCache(ProjectConfig.get_cross_cache_dir(year), args.cache_max_age)
+    cross_store = CrossStore(ProjectConfig.get_cross_db_file(year))
+
+    fix_pyppeteer()
+
+    department_ids = read_ids("@file", args.department_ids_file)
+
+    # resume the interrupted run if wanted, otherwise start a new one
+    if not (args.resume and (run_id := cross_store.get_unfinished_run_id())):
+        run_id = cross_store.start_run()
+    logger.info(f"Cross-check run ID: {run_id}")
+
+    cross_pipeline = CrossPipeline(
+        cross_store,
+        page_cache,
+        run_id,
+        fetch_mode=args.fetch_mode,
+        block_resources=args.block_resources,
+    )
+    urls = [get_cross_url(department_id, year) for department_id in department_ids]
+    asyncio.run(cross_pipeline.run(urls=urls))
+
+    # the run is kept unfinished so that failed pages are retried when it's resumed,
+    # but results of done pages are still written out
+    if pending_urls := set(urls) - cross_store.get_done_urls(run_id):
+        for pending_url in sorted(pending_urls):
+            logger.warning(f"Pending page: {pending_url}")
+        logger.warning(
+            f"{len(pending_urls)} pages of run {run_id} are not done yet. Please rerun with --resume to retry them."
+        )
+    else:
+        cross_store.finish_run(run_id)
+
+    # only output changes since the given run
+    if args.changes_since:
+        since_run_id = (
+            cross_store.get_previous_run_id(run_id) if args.changes_since == "last" else int(args.changes_since)
+        )
+        change_count = cross_store.write_out_changes(result_filepath, since_run_id)
+        logger.info(f"{change_count} changes since run {since_run_id} are written to: {result_filepath}")
+        return
+
+    # department names are taken from the crawled DB of the year if any
+    db_files = [ProjectConfig.get_crawled_db_file(year, stage) for stage in ("apply_sieve", "apply_entrance")]
+    db_file = next((db_file for db_file in db_files if db_file.is_file()), None)
+    write_out_cross_result(result_filepath, cross_store, run_id, DepartmentResolver.from_db(db_file))
+
+
+def command_apply_changeset(args: argparse.Namespace) -> None:
+    from .db_changeset import apply_changeset
+
+    for changeset_file in args.changesets:
+        apply_changeset(args.db_file, changeset_file)
+
+
+def command_export_static(args: argparse.Namespace) -> None:
+    from .static_export import STATIC_EXPORT_COMPRESSIONS, StaticExporter
+
+    year = get_year(args)
+    compressions = list(filter(None, args.compressions.split(",")))
+    if unknown_compressions := set(compressions) - set(STATIC_EXPORT_COMPRESSIONS):
+        logger.error(f"Unknown compressions: {unknown_compressions}")
+        sys.exit(1)
+
+    output_dir = args.output_dir or ProjectConfig.get_static_export_dir(year, args.stage)
+    StaticExporter(output_dir, compressions).export(
+        ProjectConfig.get_crawled_db_file(year, args.stage),
+        admission_prefix_length=args.admission_prefix_length,
+    )
+    logger.info(f"Static files are exported to: {output_dir}")
+
+
+def command_export_workbooks(args: argparse.Namespace) -> None:
+    from .workbook_export import ShardedWorkbookExporter
+
+    year = get_year(args)
+    output_dir = args.output_dir or ProjectConfig.get_workbook_export_dir(year, args.stage)
+    exporter = ShardedWorkbookExporter(
+        ProjectConfig.get_crawled_db_file(year, args.stage),
+        args.stage,
+        output_dir,
+        worker_num=args.workers,
+    )
+    exporter.export(args.partition, admissions_per_shard=args.admissions_per_shard)
+
+
+def command_funnel(args: argparse.Namespace) -> None:
+    from .stage_funnel import build_stage_funnel
+
+    build_stage_funnel(get_year(args))
+
+
+def command_http_cache(args: argparse.Namespace) -> None:
+    from .http_cache import get_http_cache
+
+    if not (http_cache := get_http_cache()):
+        logger.warning("The HTTP cache is disabled.")
+        return
+
+    if args.clear:
+        http_cache.clear()
+        logger.info(f"HTTP cache is cleared: {http_cache.cache_dir}")
+
+    stats = http_cache.get_stats()
+    logger.info(
+        f"HTTP cache: {stats['entries']} responses, {stats['bytes'] / 1024 / 1024:.1f} MiB"
+        + f" (max {http_cache.max_bytes / 1024 / 1024:.0f} MiB), hit rate {stats['hit_rate']:.1%}"
+        + f" ({stats['hits']} hits, {stats['revalidated']} revalidated, {stats['misses']} misses)"
+        + f", {stats['evictions']} evictions"
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    default_output = datetime.datetime.now().strftime("result_%Y%m%d_%H%M%S.xlsx")
+
+    common_parser = argparse.ArgumentParser(add_help=False)
+    common_parser.add_argument(
+        "--report",
+        default="",
+        help="Write a run report into this file. (.json file, or .prom for Prometheus text)",
+    )
+    common_parser.add_argument("--profile", default="", help="Write cProfile stats into this file.")
+
+    stage_parser = argparse.ArgumentParser(add_help=False)
+    stage_parser.add_argument("--stage", choices=APPLY_STAGES, required=True, help="The apply stage.")
+    stage_parser.add_argument(
+        "--year",
+        type=int,
+        default=None,
+        help="The year of data to be processed. (ex: 2017 or 106 is the same)",
+    )
+
+    crawl_parser = argparse.ArgumentParser(add_help=False)
+    crawl_parser.add_argument(
+        "--project-index-url",
+        type=str,
+        default="",
+        help="The index URL of the CAAC HTML page.",
+    )
+
+    lookup_parser = argparse.ArgumentParser(add_help=False)
+    lookup_parser.add_argument(
+        "--admission-ids",
+        default="",
+        help='Admission IDs that are going to be looked up. (separate by commas, or "@file")',
+    )
+    lookup_parser.add_argument(
+        "--department-ids",
+        default="",
+        help='Department IDs that are going to be looked up. (separate by commas, or "@file")',
+    )
+    lookup_parser.add_argument(
+        "--department-names",
+        default="",
+        help='Department names or abbreviations (like "清大電機") to be looked up as well. (separate by commas)',
+    )
+    lookup_parser.add_argument("--output", default=default_output, help="The file to output results. (.xlsx file)")
+    lookup_parser.add_argument("--output-format", default="", help='Leave it blank or "NthuEe"')
+
+    parser = argparse.ArgumentParser(prog="caac", description="Utilities for CAAC website.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparser = subparsers.add_parser(
+        "crawl",
+        parents=[common_parser, stage_parser, crawl_parser],
+        help="Crawl the CAAC website and build the DB.",
+    )
+    subparser.set_defaults(func=command_crawl)
+
+    subparser = subparsers.add_parser(
+        "crawl-all",
+        parents=[common_parser],
+        help="Crawl several years/stages concurrently under a shared budget and build their DBs.",
+    )
+    subparser.add_argument(
+        "--crawl",
+        nargs=2,
+        action="append",
+        required=True,
+        metavar=("STAGE", "PROJECT_INDEX_URL"),
+        help="A crawl of the apply stage from the index URL. (can be given multiple times)",
+    )
+    subparser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=ProjectConfig.CRAWL_MAX_CONCURRENCY,
+        help="Max requests in flight of all crawls.",
+    )
+    subparser.add_argument(
+        "--max-bandwidth",
+        type=float,
+        default=0,
+        help="Max downloaded bytes per second of all crawls. (0 for unlimited)",
+    )
+    subparser.add_argument("--db-build-workers", type=int, default=2, help="Processes to build DBs in parallel.")
+    subparser.set_defaults(func=command_crawl_all)
+
+    subparser = subparsers.add_parser(
+        "crawl-queue",
+        parents=[common_parser, stage_parser, crawl_parser],
+        help="Crawl with a shared work queue, which can be worked by many processes or hosts.",
+    )
+    subparser.add_argument(
+        "action",
+        choices=("seed", "work", "status"),
+        help="seed: start a new queue; work: work the queue until it's finished; status: show the queue.",
+    )
+    subparser.add_argument("--worker-id", default="", help="The worker ID. (hostname:pid by default)")
+    subparser.add_argument(
+        "--visibility-timeout",
+        type=float,
+        default=ProjectConfig.CRAWL_QUEUE_VISIBILITY_TIMEOUT,
+        help="Seconds before an unacknowledged item is given to another worker.",
+    )
+    subparser.set_defaults(func=command_crawl_queue)
+
+    subparser = subparsers.add_parser(
+        "watch",
+        parents=[common_parser, stage_parser, crawl_parser],
+        help="Watch the CAAC website, and crawl and build the DB as soon as results are published or changed.",
+    )
+    subparser.add_argument(
+        "--interval",
+        type=float,
+        default=ProjectConfig.RELEASE_WATCH_INTERVAL,
+        help="Seconds between polls.",
+    )
+    subparser.add_argument(
+        "--jitter",
+        type=float,
+        default=ProjectConfig.RELEASE_WATCH_JITTER,
+        help="The ratio to randomize the interval.",
+    )
+    subparser.add_argument("--once", action="store_true", help="Stop after the first crawl.")
+    subparser.add_argument(
+        "--notify-command",
+        default="",
+        help="A shell command to be run once the DB is ready,"
+        + " with env CAAC_YEAR, CAAC_STAGE, CAAC_DB_FILE and CAAC_FAILED_URL_NUM.",
+    )
+    subparser.set_defaults(func=command_watch)
+
+    subparser = subparsers.add_parser(
+        "build-db",
+        parents=[common_parser, stage_parser],
+        help="Build the DB from crawled files.",
+    )
+    subparser.set_defaults(func=command_build_db)
+
+    subparser = subparsers.add_parser(
+        "lookup",
+        parents=[common_parser, stage_parser, lookup_parser],
+        help="Look up the DB.",
+    )
+    subparser.set_defaults(func=command_lookup)
+
+    subparser = subparsers.add_parser(
+        "search",
+        parents=[common_parser, stage_parser],
+        help="Search department or university IDs by names or abbreviations.",
+    )
+    subparser.add_argument("queries", nargs="+", help='Names or abbreviations, like "清大電機" or "交大資工乙組".')
+    subparser.add_argument("--kind", choices=("departments", "universities"), default="departments")
+    subparser.add_argument("--limit", type=int, default=20, help="The max number of results of each query.")
+    subparser.set_defaults(func=command_search)
+
+    subparser = subparsers.add_parser(
+        "run",
+        parents=[common_parser, stage_parser, crawl_parser, lookup_parser],
+        help="Crawl, build the DB and look it up in one go.",
+    )
+    subparser.add_argument(
+        "--targeted",
+        action="store_true",
+        help=(
+            "Crawl pages of --department-ids first and output a partial result from them"
+            + ' (as "*_partial.xlsx") while the full crawl continues in the background.'
+        ),
+    )
+    subparser.set_defaults(func=command_run)
+
+    subparser = subparsers.add_parser(
+        "cross",
+        parents=[common_parser],
+        help="Cross-check results of departments on www.com.tw.",
+    )
+    subparser.add_argument(
+        "--year",
+        type=int,
+        default=None,
+        help="The year of data to be processed. (detected from data/crawler_XXX by default)",
+    )
+    subparser.add_argument(
+        "--department-ids-file",
+        default="department_ids.txt",
+        help="The file of department IDs to be cross-checked.",
+    )
+    subparser.add_argument("--output", default=default_output, help="The file to output results. (.xlsx file)")
+    subparser.add_argument(
+        "--fetch-mode",
+        choices=("http", "browser"),
+        default="http",
+        help="http: fetch pages directly and fall back to the browser only if needed; browser: always use the browser.",
+    )
+    subparser.add_argument(
+        "--block-resources",
+        action="store_true",
+        help="Do not load images, fonts, styles and third-party resources in the browser.",
+    )
+    subparser.add_argument(
+        "--cache-max-age",
+        type=float,
+        default=ProjectConfig.CROSS_CACHE_MAX_AGE,
+        help="Reuse cached pages fetched within this many seconds. (0 to always refetch)",
+    )
+    subparser.add_argument(
+        "--changes-since",
+        default=None,
+        help='Only output changes recorded after this run ID. ("last" for the previous run)',
+    )
+    subparser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume the last interrupted run and skip pages which have been processed.",
+    )
+    subparser.set_defaults(func=command_cross)
+
+    subparser = subparsers.add_parser(
+        "apply-changeset",
+        parents=[common_parser],
+        help="Patch a DB replica in place with changesets written by DB builds.",
+    )
+    subparser.add_argument("--db-file", required=True, help="The DB replica to be patched.")
+    subparser.add_argument("changesets", nargs="+", help="Changeset files (*.json.gz), which are applied in order.")
+    subparser.set_defaults(func=command_apply_changeset)
+
+    subparser = subparsers.add_parser(
+        "export-static",
+        parents=[common_parser, stage_parser],
+        help="Export the DB as static sharded JSON files for client-side lookups.",
+    )
+    subparser.add_argument("--output-dir", default="", help="(data/crawler_XXX/static_STAGE by default)")
+    subparser.add_argument(
+        "--compressions",
+        default="gzip",
+        help='Pre-compressed variants to be written. (separate by commas, "gzip" and/or "br")',
+    )
+    subparser.add_argument(
+        "--admission-prefix-length",
+        type=int,
+        default=5,
+        help="Admission IDs are sharded by this many leading digits.",
+    )
+    subparser.set_defaults(func=command_export_static)
+
+    subparser = subparsers.add_parser(
+        "export-workbooks",
+        parents=[common_parser, stage_parser],
+        help="Export the whole DB as sharded workbooks written in parallel, with an index workbook.",
+    )
+    subparser.add_argument("--output-dir", default="", help="(data/crawler_XXX/workbooks_STAGE by default)")
+    subparser.add_argument(
+        "--partition",
+        choices=("university", "department", "admission"),
+        default="university",
+        help="How results are partitioned into workbooks.",
+    )
+    subparser.add_argument(
+        "--admissions-per-shard",
+        type=int,
+        default=10000,
+        help='Applicants in a workbook of the "admission" partition.',
+    )
+    subparser.add_argument("--workers", type=int, default=0, help="Processes to write workbooks. (CPUs by default)")
+    subparser.set_defaults(func=command_export_workbooks)
+
+    subparser = subparsers.add_parser(
+        "funnel",
+        parents=[common_parser],
+        help="Build sieve-to-entrance funnel tables of a year from both stage DBs.",
+    )
+    subparser.add_argument(
+        "--year",
+        type=int,
+        default=None,
+        help="The year of data to be processed. (detected from data/crawler_XXX by default)",
+    )
+    subparser.set_defaults(func=command_funnel)
+
+    subparser = subparsers.add_parser(
+        "http-cache",
+        parents=[common_parser],
+        help="Show statistics of the HTTP cache shared by all tools.",
+    )
+    subparser.add_argument("--clear", action="store_true", help="Clear the HTTP cache and its statistics.")
+    subparser.set_defaults(func=command_http_cache)
+
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    args = build_parser().parse_args(argv)
+
+    t_start = time.time()
+
+    with profiled(args.profile):
+        args.func(args)
+
+    t_end = time.time()
+
+    logger.info(f"[Done] It takes {t_end - t_start} seconds.")
+
+    if args.report:
+        METRICS.write_report(args.report)
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Generator, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+
+from .crawler import Crawler
+from .project_config import ProjectConfig
+from .stage_funnel import build_stage_funnel
+
+
+class CrawlBudget:
+    """A concurrency and bandwidth budget shared by crawlers running at the same time."""
+
+    def __init__(self, max_concurrency: int, max_bandwidth: float = 0) -> None:
+        """
+        @param max_concurrency max requests in flight
+        @param max_bandwidth   max downloaded bytes per second (0 for unlimited)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_bandwidth = max_bandwidth
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        # a token bucket of bytes, which allows a burst of 1 second and goes negative after a large response
+        self._tokens = max_bandwidth
+        self._refilled_at = time.monotonic()
+
+    @contextmanager
+    def request(self) -> Generator[None, None, None]:
+        """Take a slot for a request, which waits until the bandwidth allows."""
+        with self._slots:
+            while (wait := self._get_bandwidth_wait()) > 0:
+                time.sleep(wait)
+            yield
+
+    def consume(self, size: int) -> None:
+        """Consume the bandwidth with the size of a downloaded response."""
+        if not self.max_bandwidth:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens -= size
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.max_bandwidth, self._tokens + (now - self._refilled_at) * self.max_bandwidth)
+        self._refilled_at = now
+
+    def _get_bandwidth_wait(self) -> float:
+        if not self.max_bandwidth:
+            return 0
+        with self._lock:
+            self._refill()
+            return -self._tokens / self.max_bandwidth if self._tokens < 0 else 0
+
+
+def _generate_db(year: int, apply_stage: str, data_dir: Path) -> None:
+    # this runs in a worker process, which may not share the adjusted config with the main process
+    ProjectConfig.DATA_DIR = data_dir
+    Crawler(year, apply_stage, "").generate_db()
+
+
+class CrawlOrchestrator:
+    """
+    Run several year/stage crawls concurrently under a shared budget,
+    and build the DB of each crawl in a worker process as soon as the crawl finishes.
+    Finally, funnels are built for years whose both stages are available.
+    """
+
+    def __init__(
+        self,
+        crawlers: Sequence[Crawler],
+        *,
+        db_build_worker_num: int = 2,
+        progress_interval: float = 10,
+    ) -> None:
+        self.crawlers = crawlers
+        self.db_build_worker_num = db_build_worker_num
+        self.progress_interval = progress_interval
+
+    @staticmethod
+    def get_crawl_name(crawler: Crawler) -> str:
+        return f"{crawler.year}/{crawler.apply_stage}"
+
+    def log_progress(self) -> None:
+        for crawler in self.crawlers:
+            logger.info(
+                f"[{self.get_crawl_name(crawler)}] {crawler.fetched_num} pages fetched"
+                + f", {len(crawler.failed_urls)} failed"
+            )
+
+    def run(self) -> dict[str, list[str]]:
+        """
+        Run all crawls and DB builds.
+
+        @return failed URLs of each crawl, like `{"113/apply_sieve": [...], ...}`
+        """
+        stopped = threading.Event()
+
+        def report_progress() -> None:
+            while not stopped.wait(self.progress_interval):
+                self.log_progress()
+
+        progress_thread = threading.Thread(target=report_progress, daemon=True)
+        progress_thread.start()
+
+        try:
+            with (
+                ThreadPoolExecutor(max_workers=len(self.crawlers)) as crawl_executor,
+                ProcessPoolExecutor(max_workers=self.db_build_worker_num) as db_executor,
+            ):
+                crawl_futures = {crawl_executor.submit(crawler.crawl): crawler for crawler in self.crawlers}
+                db_futures = []
+                for crawl_future in as_completed(crawl_futures):
+                    crawler = crawl_futures[crawl_future]
+                    crawl_future.result()
+                    logger.info(f"[{self.get_crawl_name(crawler)}] Crawled. Building the DB...")
+                    db_futures.append(
+                        db_executor.submit(_generate_db, crawler.year, crawler.apply_stage, ProjectConfig.DATA_DIR)
+                    )
+                for db_future in db_futures:
+                    db_future.result()
+        finally:
+            stopped.set()
+            progress_thread.join()
+
+        self.log_progress()
+
+        # funnels are built for years whose both stages are available
+        for year in sorted({crawler.year for crawler in self.crawlers}):
+            if all(
+                ProjectConfig.get_crawled_db_file(year, apply_stage).is_file()
+                for apply_stage in ("apply_sieve", "apply_entrance")
+            ):
+                build_stage_funnel(year)
+
+        return {self.get_crawl_name(crawler): list(crawler.failed_urls) for crawler in self.crawlers}
@@ -2,32 +2,65 @@ from __future__ import annotations
 
 import re
 import sqlite3
+import threading
 import time
-from collections import defaultdict
-from collections.abc import Iterable
-from concurrent.futures import ThreadPoolExecutor
+from collections.abc import Callable, Container, Generator, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import cloudscraper
-import lxml
-import lxml.etree
 from loguru import logger
-from pyquery import PyQuery as pq
 
+from .db_changeset import stamp_db, write_changeset
+from .functions import batched
+from .http_cache import get_http_cache
+from .metrics import METRICS
+from .name_search import build_name_index
 from .project_config import ProjectConfig
+from .url_frontier import UrlFrontier, canonicalize_url, extract_links
 
+if TYPE_CHECKING:
+    import cloudscraper
+
+    from .crawl_orchestrator import CrawlBudget
+    from .work_queue import WorkItem, WorkQueue
 
-class Crawler:
-    FAILED_URLS = []
 
-    def __init__(self, year: int, apply_stage: str, project_base_url: str) -> None:
+class Crawler:
+    USER_AGENT = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0 Safari/537.36"
+    )
+
+    # each thread keeps its own scraper session so that connections and solved challenges are reused
+    _thread_local = threading.local()
+
+    def __init__(
+        self,
+        year: int,
+        apply_stage: str,
+        project_base_url: str,
+        *,
+        budget: CrawlBudget | None = None,
+    ) -> None:
         self.year = year
         self.apply_stage = apply_stage
         self.result_dir = ProjectConfig.get_crawled_result_dir(self.year, self.apply_stage)
 
-        self.project_base_url = self.index_url_to_base_url(project_base_url)
+        self.project_base_url = canonicalize_url(self.index_url_to_base_url(project_base_url))
         self.college_list_url = f"{self.project_base_url}collegeList.htm"
 
+        # URLs of the current crawl, which makes sure that a page is fetched only once
+        self.frontier = UrlFrontier()
+
+        # the concurrency and bandwidth budget shared with other crawlers, if any
+        self.budget = budget
+
+        # progress of this crawl
+        self._progress_lock = threading.Lock()
+        self.fetched_num = 0
+        self.failed_urls: list[str] = []
+
     @staticmethod
     def index_url_to_base_url(index_url: str) -> str:
         base_url = index_url.strip()
@@ -44,58 +77,136 @@ class Crawler:
         return base_url.rstrip("/") + "/"
 
     def run(self, show_message: bool = False) -> None:
+        self.crawl()
+        self.generate_db()
+
+        if show_message:
+            logger.info(f"Crawled files are stored in: {self.result_dir}")
+
+    def crawl(self) -> None:
+        """Crawl all pages without generating the DB."""
         # prepare the result directory
         self.result_dir.mkdir(parents=True, exist_ok=True)
+        self.frontier = UrlFrontier()
+        # the crawler may be reused (e.g., by the release watcher), so progress is of this crawl only
+        with self._progress_lock:
+            self.fetched_num = 0
+            self.failed_urls = []
 
         filepaths = self.fetch_and_save_college_list()
         filepaths = self.fetch_and_save_department_lists(filepaths)
         self.fetch_and_save_department_applys(filepaths)
 
-        if Crawler.FAILED_URLS:
+        if self.failed_urls:
             failed_log_path = self.result_dir / "failed_urls.txt"
             with open(failed_log_path, "w", encoding="utf-8") as f:
-                for url in Crawler.FAILED_URLS:
+                for url in self.failed_urls:
                     f.write(url + "\n")
-            logger.warning(f"{len(Crawler.FAILED_URLS)} URLs failed completely. Saved to: {failed_log_path}")
+            logger.warning(f"{len(self.failed_urls)} URLs failed completely. Saved to: {failed_log_path}")
 
-        self.generate_db()
+    def run_targeted(self, department_ids: Iterable[str], show_message: bool = False) -> Future[None]:
+        """
+        Crawl pages of given departments first and build a partial DB from them,
+        then continue the full crawl, which builds the full DB, in the background.
 
-        if show_message:
-            logger.info(f"Crawled files are stored in: {self.result_dir}")
+        @return the future of the background full crawl
+        """
+        # prepare the result directory
+        self.result_dir.mkdir(parents=True, exist_ok=True)
+
+        with METRICS.timer("crawler_targeted_seconds"):
+            filepaths = self.fetch_and_save_department_pages(department_ids)
+            partial_db_file = ProjectConfig.get_crawled_partial_db_file(self.year, self.apply_stage)
+            self.generate_db(filepaths=filepaths, db_file=partial_db_file)
+
+        logger.info(f"Partial DB of {len(filepaths)} departments is built: {partial_db_file}")
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        full_crawl = executor.submit(self.run, show_message)
+        executor.shutdown(wait=False)
+
+        return full_crawl
+
+    def clear_pages(self) -> None:
+        """Remove crawled pages (but not DBs), which are outdated if the site has been changed."""
+        for path in self.result_dir.rglob("*"):
+            if path.is_file() and path.suffix in {".htm", ".html"}:
+                path.unlink()
 
     def fetch_and_save_college_list(self) -> list[str]:
-        department_lists: list[str] = []
+        self.frontier.add(self.college_list_url)
+        content = self.fetch_and_save_page(self.college_list_url, overwrite=False)
 
         # the user may give a wrong URL in the last run
         # in that case, we overwrite the old file and run again
-        try:
-            content = self.fetch_and_save_page(self.college_list_url, overwrite=False)
-            links = pq(content)("a")
-        except lxml.etree.ParserError:
+        if not (department_lists := self.extract_department_list_links(content)):
             content = self.fetch_and_save_page(self.college_list_url, overwrite=True)
-            links = pq(content)("a")
+            department_lists = self.extract_department_list_links(content)
 
-        for link in links.items():
-            href = str(link.attr("href"))
-            if href.startswith("web/"):
-                department_lists.append(href)
+        return department_lists
+
+    def get_filepath(self, url: str) -> str:
+        """Get the path of a (canonicalized) URL relative to the project base URL, like "web/001.htm"."""
+        return url[len(self.project_base_url) :] if url.startswith(self.project_base_url) else url
+
+    def extract_department_list_links(self, content: str) -> list[str]:
+        """Extract links to department list pages (like "web/001.htm") from the college list."""
+        department_lists: list[str] = []
+
+        for url in extract_links(content, self.college_list_url):
+            if (filepath := self.get_filepath(url)).startswith("web/"):
+                department_lists.append(filepath)
 
         return department_lists
 
-    def fetch_and_save_department_lists(self, filepaths: Iterable[str]) -> list[str]:
+    def extract_department_apply_links(self, content: str, department_ids: Container[str] | None = None) -> list[str]:
+        """
+        Extract links to department apply pages (like "web/common/001012.htm") from a department list page.
+
+        If `department_ids` is given, only links to those (6-digit) departments are extracted.
+        """
+        department_applys: list[str] = []
+
+        # all department list pages are in the "web/" folder
+        for url in extract_links(content, f"{self.project_base_url}web/"):
+            if not (filepath := self.get_filepath(url)).startswith(("web/common/", "web/extra/")):
+                continue
+            if department_ids is None or Path(filepath).stem[:6] in department_ids:
+                department_applys.append(filepath)
+
+        return department_applys
+
+    def submit_new_pages(
+        self,
+        executor: ThreadPoolExecutor,
+        worker_fetch_page: Callable[[str], None],
+        filepaths: Iterable[str],
+    ) -> None:
+        """Submit pages to fetch workers, skipping those which have been queued in the current crawl."""
+        for filepath in filepaths:
+            if self.frontier.add(canonicalize_url(filepath, self.project_base_url)):
+                executor.submit(worker_fetch_page, filepath)
+            else:
+                METRICS.inc("crawler_duplicate_urls_total")
+
+    def fetch_and_save_department_lists(
+        self,
+        filepaths: Iterable[str],
+        department_ids: Container[str] | None = None,
+    ) -> list[str]:
+        """
+        Fetch department list pages and collect links to department apply pages.
+
+        If `department_ids` is given, only links to those (6-digit) departments are collected.
+        """
         department_applys: list[str] = []
 
         def worker_fetch_page(filepath: str) -> None:
             content = self.fetch_and_save_page(f"{self.project_base_url}{filepath}", overwrite=False)
-            links = pq(content)("a")
-            for link in links.items():
-                href = str(link.attr("href"))
-                if href.startswith(("common/", "extra/")):
-                    department_applys.append(self.simplify_url(f"web/{href}"))
+            department_applys.extend(self.extract_department_apply_links(content, department_ids))
 
         with ThreadPoolExecutor(max_workers=ProjectConfig.CRAWLER_WORKER_NUM) as executor:
-            for filepath in filepaths:
-                executor.submit(worker_fetch_page, filepath=filepath)
+            self.submit_new_pages(executor, worker_fetch_page, filepaths)
 
         return department_applys
 
@@ -104,66 +215,195 @@ class Crawler:
             self.fetch_and_save_page(f"{self.project_base_url}{filepath}", overwrite=False)
 
         with ThreadPoolExecutor(max_workers=ProjectConfig.CRAWLER_WORKER_NUM) as executor:
-            for filepath in filepaths:
-                executor.submit(worker_fetch_page, filepath=filepath)
+            self.submit_new_pages(executor, worker_fetch_page, filepaths)
+
+        logger.info(f"Finish crawling. {self.frontier.count_states()}")
 
-        logger.info("Finish crawling.")
+    def fetch_and_save_department_pages(self, department_ids: Iterable[str]) -> list[Path]:
+        """
+        Fetch only pages needed by given departments.
+
+        The department list page of a university is derived from the first 3 digits of a department ID,
+        so other universities are not crawled at all.
+
+        @return local files of fetched department apply pages
+        """
+        department_ids = {department_id[:6] for department_id in department_ids}
+        university_ids = sorted({department_id[:3] for department_id in department_ids})
+
+        # this is not a part of the full crawl, which should fetch pages in its own frontier
+        self.frontier = UrlFrontier()
+
+        # the college list is still needed for university names
+        self.fetch_and_save_college_list()
+
+        filepaths = self.fetch_and_save_department_lists(
+            (f"web/{university_id}.htm" for university_id in university_ids),
+            department_ids,
+        )
+        self.fetch_and_save_department_applys(filepaths)
+
+        return [self.result_dir / filepath for filepath in filepaths]
 
     def fetch_and_save_page(self, url: str, overwrite: bool = True) -> str:
         """fetch and save a page depending on its URL"""
         logger.info(f"Fetching URL: {url}")
 
-        filepath = url.replace(self.project_base_url, "")
+        filepath = self.get_filepath(url)
         filepath_abs = self.result_dir / filepath
         if not overwrite and filepath_abs.is_file():
             logger.info(f"Found and reuse local file: {filepath_abs}")
+            METRICS.inc("crawler_local_file_hits_total")
             with open(filepath_abs, encoding="utf-8") as f:
-                return f.read()
-
-        content = self.get_page(url) or ""
+                content = f.read()
+            self.frontier.mark(url, "done")
+            self.update_progress(url, ok=True)
+            return content
+
+        self.frontier.mark(url, "in_flight")
+        content = self.get_page(url, budget=self.budget)
+        self.frontier.mark(url, "done" if content is not None else "failed")
+        self.update_progress(url, ok=content is not None)
+        content = content or ""
         self.write_file(filepath_abs, content)
         return content
 
-    def generate_db(self) -> None:
-        """Generate a DB file from crawled html files."""
-        db_file = ProjectConfig.get_crawled_db_file(self.year, self.apply_stage)
+    def update_progress(self, url: str, ok: bool) -> None:
+        with self._progress_lock:
+            self.fetched_num += 1
+            if not ok:
+                self.failed_urls.append(url)
+
+    def seed_queue(self, queue: WorkQueue) -> None:
+        """Put the college list into the shared work queue, from which workers discover other pages."""
+        queue.put([self.college_list_url], "college_list")
+
+    def run_queue_worker(self, queue: WorkQueue, worker_id: str, *, poll_interval: float = 1) -> None:
+        """
+        Process the shared work queue with `CRAWLER_WORKER_NUM` threads until there is no pending or leased item.
+
+        Links found in fetched pages are put back into the queue, so workers on other processes or hosts
+        share the crawl. Crawled files are written into the (shared) result directory.
+        """
+        # prepare the result directory
+        self.result_dir.mkdir(parents=True, exist_ok=True)
+
+        def worker_loop(thread_index: int) -> None:
+            # each thread leases items by itself
+            thread_worker_id = f"{worker_id}/{thread_index}"
+            while True:
+                if not (items := queue.lease(thread_worker_id)):
+                    # leased items may still produce new links, or be given back if their workers die
+                    if queue.is_finished():
+                        return
+                    time.sleep(poll_interval)
+                    continue
 
-        university_map: dict[str, str] = {}  # ["001": "國立臺灣大學", ...]
-        department_map: dict[str, str] = {}  # ["001012": "中國文學系", ...]
-        department_to_admittees: defaultdict[str, list[str]] = defaultdict(list)  # {"001012": ["10006201", ...], ...}
+                for item in items:
+                    self.process_queue_item(queue, item, thread_worker_id)
+
+        with ThreadPoolExecutor(max_workers=ProjectConfig.CRAWLER_WORKER_NUM) as executor:
+            futures = [executor.submit(worker_loop, index) for index in range(ProjectConfig.CRAWLER_WORKER_NUM)]
+        for future in futures:
+            future.result()
 
-        logger.info("DB Generation: gathering data from the source...")
+        logger.info(f"Worker {worker_id} finished the queue: {queue.count_states()}")
 
-        # build university_map
+    def process_queue_item(self, queue: WorkQueue, item: WorkItem, worker_id: str) -> None:
+        """
+        Fetch and save the page of a leased item, queue links found in it, and acknowledge it.
+
+        @param worker_id the worker which leased the item
+        """
+        logger.info(f"Fetching URL: {item.url}")
+
+        filepath_abs = self.result_dir / self.get_filepath(item.url)
+        if filepath_abs.is_file() and (content := filepath_abs.read_text(encoding="utf-8")):
+            logger.info(f"Found and reuse local file: {filepath_abs}")
+            METRICS.inc("crawler_local_file_hits_total")
+            self.update_progress(item.url, ok=True)
+        # the queue retries it later (maybe on another worker) rather than blocking this thread
+        elif (content := self.get_page(item.url, attempts=1, budget=self.budget)) is None:
+            if not queue.nack(item.url, worker_id, delay=min(3 * (2 ** (item.attempts - 1)), 30)):
+                logger.warning(f"The lease of {item.url} has been lost, so it's left to the worker holding it now")
+            return
+        else:
+            self.update_progress(item.url, ok=True)
+            self.write_file(filepath_abs, content)
+
+        if content and item.kind == "college_list":
+            links = self.extract_department_list_links(content)
+            queue.put((f"{self.project_base_url}{link}" for link in links), "department_list")
+        elif content and item.kind == "department_list":
+            links = self.extract_department_apply_links(content)
+            queue.put((f"{self.project_base_url}{link}" for link in links), "department_apply")
+
+        if not queue.ack(item.url, worker_id):
+            logger.warning(f"The lease of {item.url} has been lost, so it's left to the worker holding it now")
+
+    def iter_university_rows(self) -> Generator[tuple[str, str], None, None]:
+        """Iterate `(university_id, name)` rows from the crawled college list."""
         with open(self.result_dir / "collegeList.htm", encoding="utf-8") as f:
             content = f.read()
-            for found in re.finditer(r"\(([0-9]{3})\)\d*([\w\s]+)", content):
-                # let's find something like "(013)國立交通大學"
-                university_map[found.group(1)] = found.group(2).strip()
+        for found in re.finditer(r"\(([0-9]{3})\)\d*([\w\s]+)", content):
+            # let's find something like "(013)國立交通大學"
+            yield found.group(1), found.group(2).strip()
+
+    def iter_department_rows(
+        self,
+        filepaths: Iterable[Path] | None = None,
+    ) -> Generator[tuple[str, tuple[str, str]], None, None]:
+        """
+        Iterate rows from crawled html files (all of them by default) one file at a time.
 
-        # build department_map and department_to_admittees
-        for path in self.result_dir.rglob("*"):
+        Rows are like `("departments", (department_id, name))` or `("qualified", (department_id, admission_id))`.
+        """
+        for path in self.result_dir.rglob("*") if filepaths is None else map(Path, filepaths):
             if not (path.is_file() and path.suffix in {".htm", ".html"}):
                 continue
 
             department_id = path.stem
+            METRICS.inc("db_files_parsed_total")
             with open(path, encoding="utf-8") as f:
                 content = f.read()
-                # let's find something like "(013032)電子工程學系(甲組)"
-                for found in re.finditer(r"\(([0-9]{6})\)\s*([\w\s\[\]［］()（）]+)", content):
-                    # E.g., the ID of "(013062)資訊工程學系(乙組)［離島外加名額］" is actually "013062L"
-                    # So, we can't use `found.group(1)` directly because it doesn't contain the trailing "L".
-                    department_map[department_id] = found.group(2).strip()
-                # let's find something like "10008031" (學測准考證號)
-                for found in re.finditer(r"\b([0-9]{8})\b", content):
-                    department_to_admittees[department_id].append(found.group(1))
 
-        logger.info("DB Generation: filling data into the DB file.")
+            department_name = None
+            # let's find something like "(013032)電子工程學系(甲組)"
+            for found in re.finditer(r"\(([0-9]{6})\)\s*([\w\s\[\]［］()（）]+)", content):
+                # E.g., the ID of "(013062)資訊工程學系(乙組)［離島外加名額］" is actually "013062L"
+                # So, we can't use `found.group(1)` directly because it doesn't contain the trailing "L".
+                department_name = found.group(2).strip()
+            if department_name is not None:
+                yield "departments", (department_id, department_name)
+
+            # let's find something like "10008031" (學測准考證號)
+            for found in re.finditer(r"\b([0-9]{8})\b", content):
+                yield "qualified", (department_id, found.group(1))
+
+    def generate_db(self, filepaths: Iterable[Path] | None = None, db_file: Path | None = None) -> None:
+        """
+        Generate a DB file from crawled html files.
+
+        Rows are streamed from files and inserted in fixed-size batches,
+        so the memory usage does not grow with the number of departments and admittees.
+
+        The DB is built into a temporary file first and then replaces the old one. For the crawled DB,
+        a changeset from the old version is written, with which replicas can be patched.
+
+        @param filepaths only generate from these department pages rather than all crawled files
+        @param db_file   the DB file to be generated, which is the crawled DB file by default
+        """
+        write_changesets = db_file is None
+        db_file = db_file or ProjectConfig.get_crawled_db_file(self.year, self.apply_stage)
+        tmp_db_file = db_file.with_name(f"{db_file.name}.tmp")
+
+        logger.info("DB Generation: streaming data from the source into the DB file...")
+        t_start = time.perf_counter()
 
         # generate db
-        db_file.unlink(missing_ok=True)
+        tmp_db_file.unlink(missing_ok=True)
 
-        conn = sqlite3.connect(db_file)
+        conn = sqlite3.connect(tmp_db_file)
 
         conn.execute(
             """
@@ -190,79 +430,162 @@ class Crawler:
                 );
             """
         )
+
+        insert_sqls = {
+            "universities": """
+                INSERT OR REPLACE INTO universities (id, name)
+                VALUES (?, ?);
+            """,
+            # a later page overrides the name of the same department
+            "departments": """
+                INSERT OR REPLACE INTO departments (id, name)
+                VALUES (?, ?);
+            """,
+            "qualified": """
+                INSERT INTO qualified (department_id, admission_id)
+                VALUES (?, ?);
+            """,
+        }
+        row_counts = dict.fromkeys(insert_sqls, 0)
+        t_insert = 0.0
+
+        def insert_rows(table: str, rows: list[tuple[str, str]]) -> None:
+            nonlocal t_insert
+            t_insert_start = time.perf_counter()
+            conn.executemany(insert_sqls[table], rows)
+            t_insert += time.perf_counter() - t_insert_start
+            row_counts[table] += len(rows)
+
+        # insert data into db
+        for rows in batched(self.iter_university_rows(), ProjectConfig.DB_INSERT_BATCH_SIZE):
+            insert_rows("universities", rows)
+
+        for table_rows in batched(self.iter_department_rows(filepaths), ProjectConfig.DB_INSERT_BATCH_SIZE):
+            for table in ("departments", "qualified"):
+                if rows := [row for row_table, row in table_rows if row_table == table]:
+                    insert_rows(table, rows)
+
+        # the index is built once after all rows are inserted, which is faster than maintaining it for each insert
+        t_insert_start = time.perf_counter()
         conn.execute(
             """
                 CREATE INDEX IF NOT EXISTS admission_id_index
                 ON qualified (admission_id);
             """
         )
-
-        # insert data into db
-        conn.executemany(
+        conn.execute(
             """
-                INSERT INTO universities (id, name)
-                VALUES (?, ?);
-            """,
-            university_map.items(),
-        )
-        conn.executemany(
+                CREATE INDEX IF NOT EXISTS department_id_index
+                ON qualified (department_id);
             """
-                INSERT INTO departments (id, name)
-                VALUES (?, ?);
-            """,
-            department_map.items(),
         )
-        for department_id, admissionIds in department_to_admittees.items():
-            conn.executemany(
-                """
-                    INSERT INTO qualified (department_id, admission_id)
-                    VALUES (?, ?);
-                """,
-                zip([department_id] * len(admissionIds), admissionIds),
-            )
+
+        build_name_index(conn)
 
         conn.commit()
+        t_insert += time.perf_counter() - t_insert_start
+
+        METRICS.observe("db_insert_seconds", t_insert)
+        METRICS.observe("db_parse_seconds", time.perf_counter() - t_start - t_insert)
+
+        with METRICS.timer("db_stamp_seconds"):
+            version, _ = stamp_db(conn)
         conn.close()
 
-        logger.info("DB Generation: done.")
+        if write_changesets and db_file.is_file():
+            write_changeset(db_file, tmp_db_file, ProjectConfig.get_db_changeset_dir(self.year, self.apply_stage))
+        tmp_db_file.replace(db_file)
+
+        for table, row_count in row_counts.items():
+            METRICS.inc("db_rows_total", row_count, table=table)
+
+        logger.info(f"DB Generation: done. (version {version})")
 
     @classmethod
-    def get_page(cls, url: str) -> str | None:
-        scraper = cloudscraper.create_scraper(
-            interpreter="js2py",
-            allow_brotli=True,
-            debug=False
-        )
+    def get_scraper(cls) -> cloudscraper.CloudScraper:
+        """Get the pooled scraper session of the current thread."""
+        import cloudscraper
+
+        if (scraper := getattr(cls._thread_local, "scraper", None)) is None:
+            scraper = cls._thread_local.scraper = cloudscraper.create_scraper(
+                interpreter="js2py", allow_brotli=True, debug=False
+            )
+        return scraper
 
-        for attempt in range(1, 6):
+    @classmethod
+    def get_page(cls, url: str, *, attempts: int = 5, budget: CrawlBudget | None = None) -> str | None:
+        scraper = cls.get_scraper()
+        t_start = time.perf_counter()
+
+        def record(content: str | None, attempt: int) -> str | None:
+            seconds = time.perf_counter() - t_start
+            size = len(content) if content else 0
+            METRICS.observe("crawler_page_seconds", seconds)
+            METRICS.record("crawler_page", url=url, seconds=seconds, chars=size, attempts=attempt, ok=bool(content))
+            if content is None:
+                METRICS.inc("crawler_failed_urls_total")
+            return content
+
+        http_cache = get_http_cache()
+        cached = http_cache.get(url) if http_cache else None
+
+        if http_cache and cached and cached.is_fresh():
+            http_cache.count("hits")
+            return record(cached.content.decode("utf-8", errors="ignore"), 0)
+
+        for attempt in range(1, attempts + 1):
             try:
-                response = scraper.get(url, timeout=10, headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0 Safari/537.36"
-                })
-                content = response.content.decode("utf-8", errors="ignore")
+                METRICS.inc("crawler_requests_total")
+                # only the request itself takes a slot of the budget, retry backoffs don't
+                with budget.request() if budget else nullcontext(), METRICS.timer("crawler_request_seconds"):
+                    response = scraper.get(
+                        url,
+                        timeout=10,
+                        headers={
+                            "User-Agent": cls.USER_AGENT,
+                            **(cached.get_validators() if cached else {}),
+                        },
+                    )
+                if budget:
+                    budget.consume(len(response.content))
+                METRICS.inc("crawler_response_bytes_total", len(response.content))
+
+                # these are temporary errors so we retry later
+                if response.status_code in {429, 500, 502, 503, 504}:
+                    raise RuntimeError(f"HTTP status {response.status_code}")
+
+                body = response.content
+                if http_cache and cached and response.status_code == 304:
+                    http_cache.count("revalidated")
+                    body = http_cache.revalidate(cached, response.headers).content
+                elif http_cache and response.status_code == 200:
+                    http_cache.count("misses")
+
+                content = body.decode("utf-8", errors="ignore")
 
                 if "<html" not in content.lower():
                     logger.warning(f"Invalid HTML content from {url}")
-                    return ""
+                    return record("", attempt)
 
-                return content
+                # only a valid page is cached, otherwise a truncated or error page would be served on retry
+                if http_cache and response.status_code == 200:
+                    http_cache.store(url, body, response.headers)
+
+                return record(content, attempt)
 
             except Exception as e:
-                if attempt == 5:
+                if attempt == attempts:
                     logger.error(f"Failed to fetch {url} after {attempt} attempts: {e}")
-                    cls.FAILED_URLS.append(url)
-                    return None
+                    return record(None, attempt)
                 sleep_time = min(3 * (2 ** (attempt - 1)), 30)
                 logger.info(f"Attempt {attempt} failed for {url}. Retrying in {sleep_time}s: {e}")
+                METRICS.inc("crawler_retries_total")
                 time.sleep(sleep_time)
 
+        return None
+
     def write_file(self, filename: str | Path, content: str = "", *, encoding: str = "utf-8") -> None:
         """Write content to an external file."""
         filename = Path(filename)
         filename.parent.mkdir(parents=True, exist_ok=True)
         filename.write_text(content, encoding=encoding)
-
-    def simplify_url(self, url: str) -> str:
-        url = re.sub(r"(^|/)./", r"\1", url)
-        url = re.sub(r"(?<!:)/{2,}", r"/", url)
-        return url
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from .crawler import Crawler
+from .project_config import ProjectConfig
+
+# resource types which are still loaded in the browser when resource blocking is enabled
+# scripts are needed for solving challenges, while admission ID images are inline data URIs
+BROWSER_ALLOWED_RESOURCE_TYPES = frozenset({"document", "script", "xhr", "fetch"})
+# domains (including their subdomains) which are still loaded when resource blocking is enabled
+BROWSER_ALLOWED_DOMAINS = frozenset({"www.com.tw", "challenges.cloudflare.com"})
+
+
+def get_cross_url(department_id: str, year: int) -> str:
+    """Get the www.com.tw cross-check page URL of a department."""
+    return f"https://www.com.tw/cross/check_{department_id}_NO_0_{year}_0_3.html"
+
+
+def is_cross_page_complete(content: str) -> bool:
+    """Check whether the content is a fully served cross-check page rather than a challenge page."""
+    return 'id="mainContent"' in content and 'id="footer"' in content
+
+
+def is_browser_request_allowed(resource_type: str, url: str) -> bool:
+    """Check whether a browser request should be loaded when resource blocking is enabled."""
+    if url.startswith("data:"):
+        return True
+
+    if resource_type not in BROWSER_ALLOWED_RESOURCE_TYPES:
+        return False
+
+    host = urlsplit(url).hostname or ""
+    return any(host == domain or host.endswith(f".{domain}") for domain in BROWSER_ALLOWED_DOMAINS)
+
+
+def http_fetch_cross_page(url: str, *, attempts: int = 2) -> str | None:
+    """
+    Fetch a cross-check page without a browser.
+
+    `None` is returned if the page cannot be fetched or a challenge cannot be solved,
+    in which case the caller should fall back to the browser.
+    """
+    content = Crawler.get_page(url, attempts=attempts)
+
+    if not content or not is_cross_page_complete(content):
+        logger.warning(f"Failed to fetch {url} without a browser.")
+        return None
+
+    return content
+
+
+def http_fetch_cross_pages(urls: Iterable[str]) -> tuple[dict[str, str], list[str]]:
+    """
+    Fetch cross-check pages concurrently without a browser.
+
+    @return (contents keyed by URL, URLs that need to be fetched by a browser)
+    """
+    urls = list(urls)
+
+    with ThreadPoolExecutor(max_workers=ProjectConfig.CRAWLER_WORKER_NUM) as executor:
+        contents = dict(zip(urls, executor.map(http_fetch_cross_page, urls)))
+
+    fetched = {url: content for url, content in contents.items() if content}
+    fallback_urls = [url for url, content in contents.items() if not content]
+
+    return fetched, fallback_urls
+
+
+class CrossPageCache:
+    """A local cache of cross-check pages whose fetch time is the file modification time."""
+
+    def __init__(self, cache_dir: str | Path, max_age: float = ProjectConfig.CROSS_CACHE_MAX_AGE) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.max_age = max_age
+
+    def get_path(self, url: str) -> Path:
+        # something like "check_011322_NO_0_113_0_3.html"
+        return self.cache_dir / url.rpartition("/")[2]
+
+    def get_fetched_at(self, url: str) -> float | None:
+        """Get the timestamp when the page of the URL was fetched, or `None` if it has never been cached."""
+        if not (path := self.get_path(url)).is_file():
+            return None
+        return path.stat().st_mtime
+
+    def load(self, url: str) -> str | None:
+        """Load the cached page of the URL if it is not stale."""
+        if (fetched_at := self.get_fetched_at(url)) is None or time.time() - fetched_at > self.max_age:
+            return None
+
+        logger.info(f"Found and reuse cached page: {url}")
+        return self.get_path(url).read_text(encoding="utf-8")
+
+    def save(self, url: str, content: str) -> None:
+        path = self.get_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that an interrupted run never leaves a truncated page
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        tmp_path.replace(path)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Iterable
+from typing import Any
+
+from loguru import logger
+
+from .cross_fetcher import CrossPageCache, http_fetch_cross_page, is_browser_request_allowed
+from .cross_records import PersonRecord
+from .cross_store import CrossStore
+from .functions import get_chromium_binary_path, get_chromium_profile_dir, parse_www_com_tw
+from .project_config import ProjectConfig
+
+
+class CrossPipeline:
+    """
+    Fetch, parse and persist cross-check pages in concurrent stages connected by bounded queues.
+
+    Every persisted page is checkpointed in the store, so an interrupted run can be resumed
+    with the same run ID and only the remaining pages are processed.
+    """
+
+    def __init__(
+        self,
+        store: CrossStore,
+        page_cache: CrossPageCache,
+        run_id: int,
+        *,
+        fetch_mode: str = "http",
+        block_resources: bool = False,
+        queue_size: int = 8,
+        fetch_worker_num: int = ProjectConfig.CRAWLER_WORKER_NUM,
+        parse_worker_num: int = 2,
+    ) -> None:
+        self.store = store
+        self.page_cache = page_cache
+        self.run_id = run_id
+        self.fetch_mode = fetch_mode
+        self.block_resources = block_resources
+        self.queue_size = queue_size
+        self.fetch_worker_num = fetch_worker_num
+        self.parse_worker_num = parse_worker_num
+
+        # the browser is only launched if some page can not be fetched directly
+        self._browser: Any = None
+        self._browser_lock = asyncio.Lock()
+
+    async def run(self, urls: Iterable[str]) -> None:
+        done_urls = self.store.get_done_urls(self.run_id)
+
+        url_queue: asyncio.Queue[str | None] = asyncio.Queue()
+        page_queue: asyncio.Queue[tuple[str, str] | None] = asyncio.Queue(maxsize=self.queue_size)
+        result_queue: asyncio.Queue[tuple[str, list[PersonRecord]] | None] = asyncio.Queue(maxsize=self.queue_size)
+
+        for url in urls:
+            if url in done_urls:
+                logger.info(f"Skip checkpointed page: {url}")
+            else:
+                url_queue.put_nowait(url)
+        # each worker stops when it gets a `None`
+        for _ in range(self.fetch_worker_num):
+            url_queue.put_nowait(None)
+
+        fetchers = [
+            asyncio.create_task(self._fetch_worker(url_queue, page_queue)) for _ in range(self.fetch_worker_num)
+        ]
+        parsers = [
+            asyncio.create_task(self._parse_worker(page_queue, result_queue)) for _ in range(self.parse_worker_num)
+        ]
+        persister = asyncio.create_task(self._persist_worker(result_queue))
+
+        try:
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await page_queue.put(None)
+            await asyncio.gather(*parsers)
+            await result_queue.put(None)
+            await persister
+        finally:
+            for task in (*fetchers, *parsers, persister):
+                task.cancel()
+            await self._close_browser()
+
+        logger.info("Done crawling...")
+
+    async def _fetch_worker(
+        self,
+        url_queue: asyncio.Queue[str | None],
+        page_queue: asyncio.Queue[tuple[str, str] | None],
+    ) -> None:
+        while (url := await url_queue.get()) is not None:
+            html = self.page_cache.load(url)
+
+            if not html and self.fetch_mode == "http":
+                if html := await asyncio.to_thread(http_fetch_cross_page, url):
+                    self.page_cache.save(url, html)
+
+            if not html:
+                html = await self._browser_fetch(url)
+
+            if html:
+                await page_queue.put((url, html))
+            else:
+                logger.error(f"Failed to fetch {url}. It will be retried when the run is resumed.")
+
+    async def _parse_worker(
+        self,
+        page_queue: asyncio.Queue[tuple[str, str] | None],
+        result_queue: asyncio.Queue[tuple[str, list[PersonRecord]] | None],
+    ) -> None:
+        while (item := await page_queue.get()) is not None:
+            url, html = item
+            t_start = time.time()
+            # OCR is blocking so it is done in a thread
+            people = await asyncio.to_thread(parse_www_com_tw, html)
+            logger.info(f"Page {url} takes {time.time() - t_start:.2f} seconds to parse.")
+            await result_queue.put((url, people))
+
+    async def _persist_worker(self, result_queue: asyncio.Queue[tuple[str, list[PersonRecord]] | None]) -> None:
+        while (item := await result_queue.get()) is not None:
+            url, people = item
+            if change_count := self.store.record(self.run_id, people, url=url):
+                logger.info(f"Found {change_count} changed applies in {url}")
+
+    async def _browser_fetch(self, url: str) -> str | None:
+        from pyppeteer import launch
+
+        async with self._browser_lock:
+            if self._browser is None:
+                self._browser = await launch(
+                    executablePath=str(get_chromium_binary_path()),
+                    headless=False,
+                    userDataDir=str(get_chromium_profile_dir()),
+                )
+
+            logger.info(f"Visit {url}")
+            t_start = time.time()
+
+            try:
+                page = await self._browser.newPage()
+
+                if self.block_resources:
+                    await page.setRequestInterception(True)
+                    page.on("request", lambda request: asyncio.ensure_future(self._intercept_request(request)))
+
+                await page.goto(url)
+                await page.waitForSelector("#footer")
+                html = await page.content()
+                await page.close()
+            except Exception as e:
+                logger.error(f"Failed to fetch {url} with the browser: {e}")
+                # the browser may have crashed, so we start a fresh one for the next page
+                await self._close_browser()
+                return None
+
+            logger.info(f"Page {url} takes {time.time() - t_start:.2f} seconds to load.")
+
+        self.page_cache.save(url, html)
+        return html
+
+    @staticmethod
+    async def _intercept_request(request: Any) -> None:
+        if is_browser_request_allowed(request.resourceType, request.url):
+            await request.continue_()
+        else:
+            await request.abort()
+
+    async def _close_browser(self) -> None:
+        if self._browser is None:
+            return
+
+        try:
+            await self._browser.close()
+        except Exception as e:
+            logger.warning(f"Failed to close the browser: {e}")
+        self._browser = None
@@ -0,0 +1,204 @@
+"""
+Compact records of cross-check results, which are used from parsing to export.
+
+A person used to be a nested dict like
+
+    {
+        "_name": "考生姓名",
+        "系所編號1": {
+            "_name": "國立臺灣大學醫學系(繁星第八類)",
+            "is_dispatched": False,
+            "apply_state": "primary-3",
+        },
+        ...
+    }
+
+whose apply state string is split again and again. Here an apply state is an enum with a rank,
+records have `__slots__`, and department IDs/names are interned so they are shared by all people.
+Helpers are provided to convert from/to the old dict format.
+"""
+
+from __future__ import annotations
+
+import re
+import sys
+from collections.abc import Iterable
+from enum import IntEnum
+from typing import Any
+
+
+class ApplyState(IntEnum):
+    UNKNOWN = 0  # 未知（無資料）
+    PRIMARY = 1  # 正取
+    SPARE = 2  # 備取
+    FAILED = 3  # 落榜
+    NOT_YET = 4  # 尚未放榜
+
+    @property
+    def code(self) -> str:
+        """The code used in the old format, like "primary"."""
+        return _APPLY_STATE_CODES[self]
+
+    @property
+    def chinese(self) -> str:
+        return _APPLY_STATE_CHINESES[self]
+
+    @property
+    def is_ranked(self) -> bool:
+        return self in {ApplyState.PRIMARY, ApplyState.SPARE}
+
+
+_APPLY_STATE_CODES = {
+    ApplyState.UNKNOWN: "unknown",
+    ApplyState.PRIMARY: "primary",
+    ApplyState.SPARE: "spare",
+    ApplyState.FAILED: "failed",
+    ApplyState.NOT_YET: "notYet",
+}
+_APPLY_STATE_CHINESES = {
+    ApplyState.UNKNOWN: "不明",
+    ApplyState.PRIMARY: "正",
+    ApplyState.SPARE: "備",
+    ApplyState.FAILED: "落",
+    ApplyState.NOT_YET: "未放榜",
+}
+_APPLY_STATES_BY_CODE = {code: state for state, code in _APPLY_STATE_CODES.items()}
+
+
+def parse_chinese_apply_state(chinese: str) -> tuple[ApplyState, int]:
+    """
+    Parse an apply state on the page, like "正取3".
+
+    @return (state, rank) whose rank is 0 if it's not ranked or the rank is unknown
+    """
+    if "正" in chinese:
+        state = ApplyState.PRIMARY
+    elif "備" in chinese:
+        state = ApplyState.SPARE
+    elif "落" in chinese:
+        return ApplyState.FAILED, 0
+    else:
+        return ApplyState.UNKNOWN, 0
+
+    rank = re.search(r"(\d+)", chinese)
+    return state, int(rank.group(1)) if rank else 0
+
+
+def parse_apply_state(apply_state: str) -> tuple[ApplyState, int]:
+    """
+    Parse an apply state of the old format, like "primary-3", "spare-?" or "failed".
+
+    @return (state, rank) whose rank is 0 if it's not ranked or the rank is unknown
+    """
+    code, _, rank = apply_state.partition("-")
+    return _APPLY_STATES_BY_CODE.get(code, ApplyState.UNKNOWN), int(rank) if rank.isdigit() else 0
+
+
+def format_apply_state(state: ApplyState, rank: int) -> str:
+    """Format an apply state in the old format, like "primary-3"."""
+    if state.is_ranked:
+        return f"{state.code}-{rank or '?'}"
+    return state.code
+
+
+def format_chinese_apply_state(state: ApplyState, rank: int) -> str:
+    """Format an apply state for people, like "正3"."""
+    if state.is_ranked:
+        return f"{state.chinese}{rank or ''}"
+    return state.chinese
+
+
+class ApplyRecord:
+    __slots__ = ("department_id", "department_name", "state", "rank", "is_dispatched")
+
+    def __init__(
+        self,
+        department_id: str,
+        department_name: str,
+        state: ApplyState,
+        rank: int = 0,
+        is_dispatched: bool = False,
+    ) -> None:
+        # they are repeated among people
+        self.department_id = sys.intern(department_id)
+        self.department_name = sys.intern(department_name)
+        self.state = state
+        self.rank = rank
+        self.is_dispatched = is_dispatched
+
+    @classmethod
+    def from_dict(cls, department_id: str, department_result: dict[str, Any]) -> ApplyRecord:
+        return cls(
+            department_id,
+            department_result["_name"],
+            *parse_apply_state(department_result["apply_state"]),
+            is_dispatched=bool(department_result["is_dispatched"]),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"_name": self.department_name, "is_dispatched": self.is_dispatched, "apply_state": self.apply_state}
+
+    @property
+    def apply_state(self) -> str:
+        """The apply state in the old format, like "primary-3"."""
+        return format_apply_state(self.state, self.rank)
+
+    @property
+    def chinese_apply_state(self) -> str:
+        return format_chinese_apply_state(self.state, self.rank)
+
+    def _astuple(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ApplyRecord) and self._astuple() == other._astuple()
+
+    def __repr__(self) -> str:
+        return f"ApplyRecord{self._astuple()!r}"
+
+
+class PersonRecord:
+    __slots__ = ("admission_id", "name", "applies")
+
+    def __init__(self, admission_id: str, name: str, applies: list[ApplyRecord] | None = None) -> None:
+        self.admission_id = admission_id
+        self.name = name
+        self.applies = applies if applies is not None else []
+
+    @classmethod
+    def from_dict(cls, admission_id: str, person_result: dict[str, Any]) -> PersonRecord:
+        return cls(
+            admission_id,
+            person_result["_name"],
+            [
+                ApplyRecord.from_dict(department_id, department_result)
+                for department_id, department_result in person_result.items()
+                # special attribute like '_name'
+                if not department_id.startswith("_")
+            ],
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"_name": self.name, **{apply.department_id: apply.to_dict() for apply in self.applies}}
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, PersonRecord) and (self.admission_id, self.name, self.applies) == (
+            other.admission_id,
+            other.name,
+            other.applies,
+        )
+
+    def __repr__(self) -> str:
+        return f"PersonRecord{(self.admission_id, self.name, self.applies)!r}"
+
+
+def people_from_dict(people_result: dict[str, Any]) -> list[PersonRecord]:
+    """Convert `{"准考證號": person_result, ...}` of the old format into records."""
+    return [
+        PersonRecord.from_dict(admission_id, person_result) for admission_id, person_result in people_result.items()
+    ]
+
+
+def people_to_dict(people: Iterable[PersonRecord]) -> dict[str, Any]:
+    """Convert records into `{"准考證號": person_result, ...}` of the old format."""
+    return {person.admission_id: person.to_dict() for person in people}
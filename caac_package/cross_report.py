@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+from .cross_records import ApplyRecord, PersonRecord
+from .cross_store import CrossStore
+from .department_resolver import DepartmentResolver
+
+
+def fix_pyppeteer() -> None:
+    """Help us be able to crawl Cloudflare-protected sites."""
+    from pyppeteer import launcher
+
+    # args are copied from https://www.npmjs.com/package/puppeteer-extra-plugin-stealth
+    launcher.DEFAULT_ARGS = [
+        "--disable-background-networking",
+        "--disable-background-timer-throttling",
+        "--disable-backgrounding-occluded-windows",
+        "--disable-blink-features=AutomationControlled",
+        "--disable-breakpad",
+        "--disable-client-side-phishing-detection",
+        "--disable-component-extensions-with-background-pages",
+        "--disable-default-apps",
+        "--disable-dev-shm-usage",
+        "--disable-extensions",
+        "--disable-features=RendererCodeIntegrity,Translate",
+        "--disable-hang-monitor",
+        "--disable-ipc-flooding-protection",
+        "--disable-popup-blocking",
+        "--disable-prompt-on-repost",
+        "--disable-renderer-backgrounding",
+        "--disable-sync",
+        "--enable-automation",
+        "--enable-blink-features=IdleDetection",
+        "--enable-features=NetworkService,NetworkServiceInProcess",
+        "--force-color-profile=srgb",
+        "--metrics-recording-only",
+        "--no-first-run",
+        "--password-store=basic",
+        "--use-mock-keychain",
+    ]
+
+
+sheet_fmts = {
+    "base": {"align": "left", "valign": "vcenter", "text_wrap": 1, "font_size": 9},
+    # 清大電機
+    "nthuEe": {"bold": 1},
+    # 校系名稱
+    "department": {"top": 1, "bottom": 1, "left": 1, "right": 0},
+    # 榜單狀態
+    "apply_state": {"top": 1, "bottom": 1, "left": 0, "right": 1},
+    # 榜單狀態：正取
+    "apply_state-primary": {"bg_color": "#99FF99"},
+    # 榜單狀態：備取
+    "apply_state-spare": {"bg_color": "#FFFF99"},
+    # 榜單狀態：落榜
+    "apply_state-failed": {"bg_color": "#FF9999"},
+    # 榜單狀態：未知（無資料）
+    "apply_state-unknown": {"bg_color": "#D0D0D0"},
+    # 榜單狀態：已分發
+    "apply_state-dispatched": {"bg_color": "#99D8FF"},
+}
+
+sheet_header = [
+    {"text": "准考證號"},
+    {"text": "考生姓名"},
+    {"text": "分發結果"},
+    {"text": "校系名稱"},
+    {"text": "榜單狀態"},
+]
+
+
+def build_sheet_row(person: PersonRecord, resolver: DepartmentResolver | None = None) -> list[dict[str, Any]]:
+    """
+    Build a sheet row like `[{"text": "xxx", "fmts": ["yyy", ...]}, ...]` for a person.
+
+    A person of the old dict format can be converted by `PersonRecord.from_dict()`.
+    Department names are resolved by the (shared) resolver, which should be given when building many rows.
+    """
+    resolver = resolver or DepartmentResolver()
+
+    def nthu_sort(apply: ApplyRecord) -> str:
+        department_info = resolver.resolve(apply.department_id, apply.department_name)
+
+        # 清華大學 be the later one
+        if department_info.is_nthu:
+            # note that in ASCII code, 'Z' > 'B' > 'A'
+            # 電機工程 be the later one
+            if department_info.is_nthu_ee:
+                return f"Z{apply.department_id}"
+            # other department the the first
+            else:
+                return f"B{apply.department_id}"
+        # other university be the first
+        else:
+            return f"A{apply.department_id}"
+
+    row = []
+    row.append({"text": person.admission_id})
+    row.append({"text": person.name})
+
+    # get the name of the dispatched department
+    department_name_dispatched = next(
+        (
+            resolver.resolve(apply.department_id, apply.department_name).display_name
+            for apply in person.applies
+            if apply.is_dispatched
+        ),
+        "",
+    )
+
+    row.append({"text": department_name_dispatched})
+
+    # we hope show NTHU's result as the last
+    for apply in sorted(person.applies, key=nthu_sort):
+        department_info = resolver.resolve(apply.department_id, apply.department_name)
+
+        apply_type = "dispatched" if apply.is_dispatched else apply.state.code  # ex: 'spare'
+
+        row.append({
+            "text": department_info.display_name,
+            # NTHU specialization
+            "fmts": ["department", "nthuEe"] if department_info.is_nthu_ee else ["department"],
+        })
+
+        apply_state_icon = "👑" if apply.is_dispatched else ""
+
+        row.append({
+            "text": f"{apply_state_icon} {apply.chinese_apply_state}".strip(),
+            "fmts": ["apply_state", f"apply_state-{apply_type}"],
+        })
+
+    return row
+
+
+def write_out_cross_result(
+    output_file: str | Path,
+    store: CrossStore,
+    run_id: int,
+    resolver: DepartmentResolver | None = None,
+) -> None:
+    """Write results observed in the run into a xlsx file."""
+    import xlsxwriter
+
+    # names of a department are resolved only once for all people
+    resolver = resolver or DepartmentResolver()
+
+    # rows are streamed from the store in the order of admission ID, so the workbook can be written in constant memory
+    with xlsxwriter.Workbook(str(output_file), {"constant_memory": True}) as wb:
+        ws = wb.add_worksheet("第二階段-交叉查榜")
+        ws.freeze_panes(1, 3)
+
+        cell_fmts: dict[tuple[str, ...], Any] = {}
+
+        def write_sheet_row(row_num: int, row: list[dict[str, Any]]) -> None:
+            for col_num, col in enumerate(row):
+                fmts = tuple(col.get("fmts", ()))
+                # determine the cell format
+                if fmts not in cell_fmts:
+                    cell_fmt = sheet_fmts["base"].copy()
+                    for fmt in fmts:
+                        if fmt in sheet_fmts:
+                            cell_fmt.update(sheet_fmts[fmt])
+                    cell_fmts[fmts] = wb.add_format(cell_fmt)
+                # apply the cell format
+                ws.write(row_num, col_num, col["text"], cell_fmts[fmts])
+
+        write_sheet_row(0, sheet_header)
+        for row_num, person in enumerate(store.iter_people(run_id), 1):
+            write_sheet_row(row_num, build_sheet_row(person, resolver))
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import datetime
+import sqlite3
+from collections.abc import Generator, Iterable
+from pathlib import Path
+from typing import Any
+
+from .cross_records import ApplyRecord, PersonRecord, parse_apply_state
+from .functions import normalize_apply_state_e2c
+
+
+class CrossStore:
+    """A persistent store of cross-check results which keeps the changes between runs."""
+
+    # db handle
+    conn: sqlite3.Connection | None = None
+
+    def __init__(self, db_file: str | Path) -> None:
+        db_file = Path(db_file)
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(db_file)
+        self.conn.executescript(
+            """
+                CREATE TABLE IF NOT EXISTS runs (
+                    id             INTEGER      PRIMARY KEY    AUTOINCREMENT,
+                    started_at     CHAR(19)                    NOT NULL,
+                    finished_at    CHAR(19)
+                );
+
+                CREATE TABLE IF NOT EXISTS latest (
+                    admission_id       CHAR(8)      NOT NULL,
+                    department_id      CHAR(7)      NOT NULL,
+                    person_name        CHAR(50)     NOT NULL,
+                    department_name    CHAR(100)    NOT NULL,
+                    apply_state        CHAR(20)     NOT NULL,
+                    is_dispatched      INTEGER      NOT NULL,
+                    observed_at        CHAR(19)     NOT NULL,
+                    run_id             INTEGER      NOT NULL,
+                    PRIMARY KEY(admission_id, department_id),
+                    FOREIGN KEY(run_id) REFERENCES runs(id)
+                );
+
+                CREATE INDEX IF NOT EXISTS latest_run_id_index
+                ON latest (run_id);
+
+                CREATE TABLE IF NOT EXISTS changes (
+                    run_id               INTEGER      NOT NULL,
+                    admission_id         CHAR(8)      NOT NULL,
+                    department_id        CHAR(7)      NOT NULL,
+                    old_apply_state      CHAR(20),
+                    new_apply_state      CHAR(20)     NOT NULL,
+                    old_is_dispatched    INTEGER,
+                    new_is_dispatched    INTEGER      NOT NULL,
+                    observed_at          CHAR(19)     NOT NULL,
+                    FOREIGN KEY(run_id) REFERENCES runs(id)
+                );
+
+                CREATE INDEX IF NOT EXISTS changes_run_id_index
+                ON changes (run_id);
+
+                CREATE TABLE IF NOT EXISTS run_pages (
+                    run_id    INTEGER        NOT NULL,
+                    url       CHAR(200)      NOT NULL,
+                    done_at   CHAR(19)       NOT NULL,
+                    PRIMARY KEY(run_id, url),
+                    FOREIGN KEY(run_id) REFERENCES runs(id)
+                );
+            """
+        )
+
+    def __del__(self) -> None:
+        if self.conn:
+            self.conn.close()
+
+    @staticmethod
+    def now() -> str:
+        return datetime.datetime.now().isoformat(sep=" ", timespec="seconds")
+
+    def start_run(self) -> int:
+        assert self.conn
+        with self.conn:
+            cursor = self.conn.execute("INSERT INTO runs (started_at) VALUES (?)", (self.now(),))
+        assert cursor.lastrowid is not None
+        return cursor.lastrowid
+
+    def finish_run(self, run_id: int) -> None:
+        assert self.conn
+        with self.conn:
+            self.conn.execute("UPDATE runs SET finished_at=? WHERE id=?", (self.now(), run_id))
+
+    def get_previous_run_id(self, run_id: int) -> int:
+        """
+        Get the ID of the finished run before the given one, or 0 if there is none.
+
+        Interrupted or pending runs are skipped since they are incomplete baselines.
+        """
+        assert self.conn
+        cursor = self.conn.execute("SELECT MAX(id) FROM runs WHERE id<? AND finished_at IS NOT NULL", (run_id,))
+        return cursor.fetchone()[0] or 0
+
+    def get_unfinished_run_id(self) -> int | None:
+        """Get the ID of the latest run which was interrupted, if any."""
+        assert self.conn
+        cursor = self.conn.execute("SELECT MAX(id) FROM runs")
+        run_id = cursor.fetchone()[0]
+        cursor = self.conn.execute("SELECT finished_at FROM runs WHERE id=?", (run_id,))
+        return run_id if (row := cursor.fetchone()) and row[0] is None else None
+
+    def get_done_urls(self, run_id: int) -> set[str]:
+        """Get URLs of pages which have been recorded in the run."""
+        assert self.conn
+        cursor = self.conn.execute("SELECT url FROM run_pages WHERE run_id=?", (run_id,))
+        return {row[0] for row in cursor}
+
+    def record(self, run_id: int, people: Iterable[PersonRecord], url: str | None = None) -> int:
+        """
+        Record the parsed result of a cross-check page.
+
+        Apply states are stored in the old format like "primary-3", so existing stores keep working.
+
+        If the URL of the page is given, the page is checkpointed as done in the run at the same time.
+
+        @return the number of changed (or newly seen) applies
+        """
+        assert self.conn
+        observed_at = self.now()
+        change_count = 0
+
+        with self.conn:
+            for person in people:
+                admission_id = person.admission_id
+                for apply in person.applies:
+                    department_id = apply.department_id
+                    apply_state = apply.apply_state
+                    is_dispatched = int(apply.is_dispatched)
+
+                    old = self.conn.execute(
+                        """
+                            SELECT apply_state, is_dispatched
+                            FROM latest
+                            WHERE admission_id=? AND department_id=?
+                        """,
+                        (admission_id, department_id),
+                    ).fetchone()
+
+                    if old != (apply_state, is_dispatched):
+                        change_count += 1
+                        self.conn.execute(
+                            """
+                                INSERT INTO changes (
+                                    run_id, admission_id, department_id,
+                                    old_apply_state, new_apply_state,
+                                    old_is_dispatched, new_is_dispatched,
+                                    observed_at
+                                )
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+                            """,
+                            (
+                                run_id,
+                                admission_id,
+                                department_id,
+                                old[0] if old else None,
+                                apply_state,
+                                old[1] if old else None,
+                                is_dispatched,
+                                observed_at,
+                            ),
+                        )
+
+                    self.conn.execute(
+                        """
+                            INSERT OR REPLACE INTO latest (
+                                admission_id, department_id,
+                                person_name, department_name,
+                                apply_state, is_dispatched,
+                                observed_at, run_id
+                            )
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+                        """,
+                        (
+                            admission_id,
+                            department_id,
+                            person.name,
+                            apply.department_name,
+                            apply_state,
+                            is_dispatched,
+                            observed_at,
+                            run_id,
+                        ),
+                    )
+
+            if url:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO run_pages (run_id, url, done_at) VALUES (?, ?, ?)",
+                    (run_id, url, observed_at),
+                )
+
+        return change_count
+
+    def iter_people(self, run_id: int) -> Generator[PersonRecord, None, None]:
+        """Iterate results observed in the run person by person, ordered by admission ID."""
+        assert self.conn
+        cursor = self.conn.execute(
+            """
+                SELECT admission_id, person_name, department_id, department_name, apply_state, is_dispatched
+                FROM latest
+                WHERE run_id=?
+                ORDER BY admission_id, department_id
+            """,
+            (run_id,),
+        )
+
+        person: PersonRecord | None = None
+        for admission_id, person_name, department_id, department_name, apply_state, is_dispatched in cursor:
+            if person is None or admission_id != person.admission_id:
+                if person:
+                    yield person
+                person = PersonRecord(admission_id, person_name)
+
+            # the apply state is parsed only once here
+            person.applies.append(
+                ApplyRecord(
+                    department_id,
+                    department_name,
+                    *parse_apply_state(apply_state),
+                    is_dispatched=bool(is_dispatched),
+                )
+            )
+
+        if person:
+            yield person
+
+    def iter_changes_since(self, run_id: int) -> Generator[dict[str, Any], None, None]:
+        """Iterate changes recorded after the given run, ordered by admission ID."""
+        assert self.conn
+        cursor = self.conn.execute(
+            """
+                SELECT
+                    changes.run_id, changes.admission_id, latest.person_name,
+                    changes.department_id, latest.department_name,
+                    changes.old_apply_state, changes.new_apply_state,
+                    changes.old_is_dispatched, changes.new_is_dispatched,
+                    changes.observed_at
+                FROM changes
+                JOIN latest USING (admission_id, department_id)
+                WHERE changes.run_id>?
+                ORDER BY changes.admission_id, changes.department_id, changes.run_id
+            """,
+            (run_id,),
+        )
+        columns = [column[0] for column in cursor.description]
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+    def write_out_changes(self, output_file: str, since_run_id: int) -> int:
+        """
+        Write changes recorded after the given run into a xlsx file.
+
+        @return the number of written changes
+        """
+        import xlsxwriter
+
+        row_num = 0
+
+        with xlsxwriter.Workbook(output_file) as wb:
+            cell_format = wb.add_format({
+                "align": "left",
+                "valign": "vcenter",
+                "text_wrap": True,
+                "font_size": 9,
+            })
+
+            ws = wb.add_worksheet("第二階段-交叉查榜（變動）")
+            ws.freeze_panes(1, 2)
+
+            ws.write_row(
+                0,
+                0,
+                ["准考證號", "考生姓名", "校系名稱", "原榜單狀態", "新榜單狀態", "觀測時間"],
+                cell_format,
+            )
+
+            for row_num, change in enumerate(self.iter_changes_since(since_run_id), 1):
+                old_state = (
+                    normalize_apply_state_e2c(change["old_apply_state"]) + ("👑" if change["old_is_dispatched"] else "")
+                    if change["old_apply_state"]
+                    else ""
+                )
+                new_state = normalize_apply_state_e2c(change["new_apply_state"]) + (
+                    "👑" if change["new_is_dispatched"] else ""
+                )
+
+                ws.write_row(
+                    row_num,
+                    0,
+                    [
+                        int(change["admission_id"]),
+                        change["person_name"],
+                        change["department_name"],
+                        old_state,
+                        new_state,
+                        change["observed_at"],
+                    ],
+                    cell_format,
+                )
+
+        return row_num
@@ -0,0 +1,179 @@
+"""
+Row-level changesets between versions of a crawled DB.
+
+Each built DB is stamped with a version ID and a checksum of its rows in the `db_meta` table.
+A changeset holds rows deleted from and inserted into each table since the previous version,
+so a replica on a lookup machine is patched with kilobytes rather than copied as a whole file.
+Tables are compared as sets of rows, so duplicated rows are not distinguished.
+"""
+
+from __future__ import annotations
+
+import datetime
+import gzip
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from .metrics import METRICS
+from .name_search import build_name_index
+
+# {table: (columns, key columns), ...}
+CHANGESET_TABLES: dict[str, tuple[tuple[str, ...], tuple[str, ...]]] = {
+    "universities": (("id", "name"), ("id",)),
+    "departments": (("id", "name"), ("id",)),
+    "qualified": (("department_id", "admission_id"), ("department_id", "admission_id")),
+}
+
+
+def compute_db_checksum(conn: sqlite3.Connection, schema: str = "main") -> str:
+    """Compute the checksum of rows of changeset tables, which does not depend on the row order."""
+    hasher = hashlib.sha256()
+    for table, (columns, _) in CHANGESET_TABLES.items():
+        hasher.update(f"\x1e{table}".encode())
+        column_list = ", ".join(columns)
+        cursor = conn.execute(f"SELECT DISTINCT {column_list} FROM {schema}.{table} ORDER BY {column_list}")
+        for row in cursor:
+            hasher.update(("\x1f".join(row) + "\n").encode())
+    return hasher.hexdigest()
+
+
+def get_db_version(conn: sqlite3.Connection, schema: str = "main") -> tuple[str, str] | None:
+    """Get `(version, checksum)` of a DB, or `None` if it has never been stamped."""
+    try:
+        meta = dict(conn.execute(f"SELECT key, value FROM {schema}.db_meta").fetchall())
+    except sqlite3.OperationalError:
+        return None
+    return meta["version"], meta["checksum"]
+
+
+def set_db_version(conn: sqlite3.Connection, version: str, checksum: str) -> None:
+    conn.execute("CREATE TABLE IF NOT EXISTS db_meta (key CHAR(20) PRIMARY KEY NOT NULL, value CHAR(100) NOT NULL)")
+    conn.executemany(
+        "INSERT OR REPLACE INTO db_meta (key, value) VALUES (?, ?)",
+        (("version", version), ("checksum", checksum)),
+    )
+
+
+def stamp_db(conn: sqlite3.Connection) -> tuple[str, str]:
+    """
+    Stamp a newly built DB with a new version ID and its checksum.
+
+    @return (version, checksum)
+    """
+    checksum = compute_db_checksum(conn)
+    version = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{checksum[:8]}"
+    set_db_version(conn, version, checksum)
+    conn.commit()
+    return version, checksum
+
+
+def write_changeset(old_db_file: str | Path, new_db_file: str | Path, changeset_dir: str | Path) -> Path | None:
+    """
+    Write the changeset from the old DB to the new DB, both of which must have been stamped.
+
+    @return the changeset file, or `None` if the old DB has no version to be patched from
+    """
+    conn = sqlite3.connect(new_db_file)
+    conn.execute("ATTACH DATABASE ? AS old", (str(old_db_file),))
+
+    if (old_version := get_db_version(conn, "old")) is None:
+        logger.info(f"No changeset is written since the old DB has no version: {old_db_file}")
+        conn.close()
+        return None
+    new_version = get_db_version(conn)
+    assert new_version
+
+    with METRICS.timer("db_changeset_seconds"):
+        changes: dict[str, dict[str, list[list[str]]]] = {}
+        for table, (columns, _) in CHANGESET_TABLES.items():
+            column_list = ", ".join(columns)
+            changes[table] = {
+                "delete": conn.execute(
+                    f"SELECT {column_list} FROM old.{table} EXCEPT SELECT {column_list} FROM main.{table}"
+                ).fetchall(),
+                "insert": conn.execute(
+                    f"SELECT {column_list} FROM main.{table} EXCEPT SELECT {column_list} FROM old.{table}"
+                ).fetchall(),
+            }
+    conn.close()
+
+    changeset = {
+        "from_version": old_version[0],
+        "from_checksum": old_version[1],
+        "to_version": new_version[0],
+        "to_checksum": new_version[1],
+        "changes": changes,
+    }
+
+    changeset_dir = Path(changeset_dir)
+    changeset_dir.mkdir(parents=True, exist_ok=True)
+    changeset_file = changeset_dir / f"{old_version[0]}_{new_version[0]}.json.gz"
+    changeset_file.write_bytes(gzip.compress(json.dumps(changeset, ensure_ascii=False).encode("utf-8")))
+
+    change_count = sum(len(rows) for table_changes in changes.values() for rows in table_changes.values())
+    METRICS.inc("db_changeset_rows_total", change_count)
+    logger.info(f"Changeset of {change_count} rows ({changeset_file.stat().st_size} bytes): {changeset_file}")
+
+    return changeset_file
+
+
+def read_changeset(changeset_file: str | Path) -> dict[str, Any]:
+    return json.loads(gzip.decompress(Path(changeset_file).read_bytes()))
+
+
+def apply_changeset(db_file: str | Path, changeset_file: str | Path) -> str:
+    """
+    Patch a DB replica in place with a changeset in a single transaction,
+    which is rolled back unless the patched DB has exactly the checksum of the new version.
+
+    @return the version of the patched DB
+    """
+    changeset = read_changeset(changeset_file)
+
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+
+        if (version := get_db_version(conn)) is None:
+            raise Exception(f"The DB has no version to be patched: {db_file}")
+        if version != (changeset["from_version"], changeset["from_checksum"]):
+            raise Exception(f"The changeset is from {changeset['from_version']} but the DB is {version[0]}")
+
+        names_changed = False
+        for table, (columns, key_columns) in CHANGESET_TABLES.items():
+            table_changes = changeset["changes"][table]
+            key_indexes = [columns.index(column) for column in key_columns]
+            conn.executemany(
+                f"DELETE FROM {table} WHERE {' AND '.join(f'{column}=?' for column in key_columns)}",
+                ([row[index] for index in key_indexes] for row in table_changes["delete"]),
+            )
+            conn.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                table_changes["insert"],
+            )
+            if table != "qualified" and (table_changes["delete"] or table_changes["insert"]):
+                names_changed = True
+
+        if names_changed:
+            build_name_index(conn)
+
+        if (checksum := compute_db_checksum(conn)) != changeset["to_checksum"]:
+            raise Exception(f"Checksum mismatched after patching: {checksum} != {changeset['to_checksum']}")
+
+        set_db_version(conn, changeset["to_version"], changeset["to_checksum"])
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    logger.info(f"DB is patched from {changeset['from_version']} to {changeset['to_version']}: {db_file}")
+
+    return changeset["to_version"]
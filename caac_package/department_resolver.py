@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from .metrics import METRICS
+
+
+def split_university_name_and_department_name(fullName: str) -> tuple[str, str]:
+    """
+    @brief 將 "國立臺灣大學機械工程學系" 轉換為 ['國立臺灣大學', '機械工程學系']
+
+    @param fullName The full university + department name string
+
+    @return (university_name, department_name)
+    """
+    if not (findUniverityName := re.search(r"((?:[^\s]+)(?:大學|學院))(.*)", fullName)):
+        logger.error(f"Failed to split university name: {fullName}")
+        return ("", "")
+
+    return (findUniverityName.group(1).strip(), findUniverityName.group(2).strip())
+
+
+# like "(甲組)" in "電子工程學系(甲組)"
+GROUP_PATTERN = re.compile(r"[(（]([^()（）]*組)[)）]")
+# like "［離島外加名額］" in "資訊工程學系(乙組)［離島外加名額］"
+FLAG_PATTERN = re.compile(r"[\[［]([^\[\]［］]+)[\]］]")
+
+
+@dataclass(frozen=True)
+class DepartmentInfo:
+    department_id: str
+    university_name: str  # "國立清華大學"
+    department_name: str  # "資訊工程學系(乙組)［離島外加名額］"
+    group: str  # "乙組"
+    flags: tuple[str, ...]  # ("離島外加名額",)
+
+    @property
+    def display_name(self) -> str:
+        return f"{self.university_name}\n{self.department_name}"
+
+    @property
+    def is_nthu(self) -> bool:
+        return "清華大學" in self.university_name
+
+    @property
+    def is_nthu_ee(self) -> bool:
+        return self.is_nthu and "電機工程" in self.department_name
+
+
+class DepartmentResolver:
+    """
+    Resolve department IDs into structured metadata, which is memoized.
+
+    Names come from the `universities`/`departments` tables of a crawled DB.
+    For IDs which are unknown to the DB, the full name (like "國立臺灣大學醫學系(繁星第八類)") is split with a regex.
+    """
+
+    def __init__(
+        self,
+        university_map: dict[str, str] | None = None,
+        department_map: dict[str, str] | None = None,
+    ) -> None:
+        """
+        @param university_map {"001": "國立臺灣大學", ...}
+        @param department_map {"001012": "中國文學系", ...}
+        """
+        self.university_map = university_map or {}
+        self.department_map = department_map or {}
+
+        self._infos: dict[tuple[str, str], DepartmentInfo] = {}
+
+    @classmethod
+    def from_db(cls, db_file: str | Path | None) -> DepartmentResolver:
+        """Load names from a crawled DB. If the DB does not exist, only the regex is used."""
+        if db_file is None or not Path(db_file).is_file():
+            logger.warning(f"DB file does not exist so department names are resolved by a regex: {db_file}")
+            return cls()
+
+        conn = sqlite3.connect(db_file)
+        university_map = dict(conn.execute("SELECT id, name FROM universities").fetchall())
+        department_map = dict(conn.execute("SELECT id, name FROM departments").fetchall())
+        conn.close()
+
+        return cls(university_map, department_map)
+
+    def resolve(self, department_id: str, full_name: str = "") -> DepartmentInfo:
+        """
+        @param department_id like "011312"
+        @param full_name     the full university + department name, which is only used if the ID is unknown
+        """
+        # the full name does not matter if the ID is known
+        key = (department_id, "" if department_id in self.department_map else full_name)
+        if (info := self._infos.get(key)) is None:
+            info = self._infos[key] = self._build_info(department_id, full_name)
+        return info
+
+    def _build_info(self, department_id: str, full_name: str) -> DepartmentInfo:
+        if (department_name := self.department_map.get(department_id)) is not None:
+            university_name = self.university_map.get(department_id[:3], "")
+        else:
+            METRICS.inc("department_resolver_fallbacks_total")
+            university_name, department_name = split_university_name_and_department_name(full_name)
+            university_name = self.university_map.get(department_id[:3], university_name)
+
+        return DepartmentInfo(
+            department_id=department_id,
+            university_name=university_name,
+            department_name=department_name,
+            group=found.group(1) if (found := GROUP_PATTERN.search(department_name)) else "",
+            flags=tuple(FLAG_PATTERN.findall(department_name)),
+        )
@@ -7,23 +7,38 @@ from collections import ChainMap
 from collections.abc import Generator, Iterable
 from io import BytesIO
 from pathlib import Path
-from typing import Any, TypeVar
+from typing import TYPE_CHECKING, Any, TypeVar
 
-import pytesseract
 from loguru import logger
-from PIL import Image
-from pyquery import PyQuery as pq
+
+from .cross_records import (
+    ApplyRecord,
+    PersonRecord,
+    format_apply_state,
+    format_chinese_apply_state,
+    parse_apply_state,
+    parse_chinese_apply_state,
+)
+
+# heavy modules are imported when they are used so that commands which do not need them start fast
+if TYPE_CHECKING:
+    import lxml.html
+    from PIL import Image
 
 _T = TypeVar("_T")
 
 
 def data_uri_to_image(data_uri: str) -> Image.Image:
+    from PIL import Image
+
     base64_data = re.sub(r"^data:image/[^;]+;base64,", "", data_uri)
     byte_data = base64.b64decode(base64_data)
     return Image.open(BytesIO(byte_data))
 
 
 def ocr_data_uri(data_uri: str) -> str:
+    import pytesseract
+
     # ensure that tesseract.exe is in PATH
     extra_paths: list[str] = [
         # R"C:\Program Files\Tesseract-OCR",
@@ -64,35 +79,48 @@ def get_chromium_profile_dir() -> Path:
     return get_chromium_dir() / "profile"
 
 
-def parse_www_com_tw(content: str = "") -> dict[str, Any]:
-    people_result: dict[str, Any] = {
-        # "准考證號": {
-        #     "_name": "考生姓名",
-        #     "系所編號1": {
-        #         "_name": "國立臺灣大學醫學系(繁星第八類)",
-        #         "is_dispatched": False,
-        #         "apply_state": "primary",
-        #     }
-        #     ...
-        # },
-        # ...
-    }
+def _iter_table_rows(table: lxml.html.HtmlElement) -> Generator[lxml.html.HtmlElement, None, None]:
+    """Iterate direct rows of a table, no matter the "tbody" is in the source or not."""
+    for child in table:
+        if child.tag == "tr":
+            yield child
+        elif child.tag == "tbody":
+            yield from (row for row in child if row.tag == "tr")
+
+
+def _get_cells(row: lxml.html.HtmlElement) -> list[lxml.html.HtmlElement]:
+    return [child for child in row if child.tag in {"td", "th"}]
+
+
+def _get_text(element: lxml.html.HtmlElement | None) -> str:
+    return " ".join(element.text_content().split()) if element is not None else ""
+
+
+def parse_www_com_tw(content: str = "") -> list[PersonRecord]:
+    """Parse a cross-check page into records. Use `people_to_dict()` to get the old dict format."""
+    import lxml.html
+
+    people: list[PersonRecord] = []
 
     admission_id_regex = re.compile(r"\b(\d{8})\b")
     department_id_regex = re.compile(r"_(\d{6,7})_")
 
-    # sanitization
-    content = content.replace("\r", "").replace("\n", " ")
-    # get the result html table
-    person_rows = pq(content)("#mainContent > table:first > tbody > tr")
-
-    for person_row in person_rows.items():
-        html = person_row.outer_html()
+    if not content.strip():
+        return people
 
-        if not (matches := re.search(r'data:image/[^;]+;base64,[^\'"]*', str(html))):
+    # get the result html table
+    if not (tables := lxml.html.fromstring(content).xpath('//*[@id="mainContent"]/table[1]')):
+        return people
+
+    for person_row in _iter_table_rows(tables[0]):
+        data_uri = next(
+            (src for img in person_row.iter("img") if (src := img.get("src", "")).startswith("data:image/")),
+            None,
+        )
+        if not data_uri:
             continue
 
-        admission_id = ocr_data_uri(matches.group(0))
+        admission_id = ocr_data_uri(data_uri)
         # simple sanitization...
         admission_id = re.sub(r"[^0-9a-zA-Z]+", "", admission_id)
 
@@ -100,69 +128,55 @@ def parse_www_com_tw(content: str = "") -> dict[str, Any]:
             logger.error(f"Wrong admission ID: {admission_id}")
             continue
 
-        person_name = str(person_row("td:nth-child(4)").text()).strip()
-        person_result: dict[str, dict[str, Any]] = {admission_id: {"_name": person_name}}
-
-        apply_table_rows = person_row("td:nth-child(5) table:first > tbody > tr")
-        for apply_table_row in apply_table_rows.items():
-            if not (find_department_id := department_id_regex.search(str(apply_table_row.outer_html()))):
+        person_cells = _get_cells(person_row)
+        person_name = _get_text(person_cells[3] if len(person_cells) > 3 else None)
+        person = PersonRecord(admission_id, person_name)
+
+        apply_tables = person_cells[4].xpath("(.//table)[1]") if len(person_cells) > 4 else []
+        for apply_table_row in _iter_table_rows(apply_tables[0]) if apply_tables else ():
+            department_id = ""
+            is_dispatched = False
+
+            # walk the row once for the department ID (in attributes) and the dispatched marker (anywhere)
+            for element in apply_table_row.iter():
+                for value in element.attrib.values():
+                    if not department_id and (find_department_id := department_id_regex.search(value)):
+                        department_id = find_department_id.group(1)
+                    is_dispatched = is_dispatched or "分發錄取" in value
+                is_dispatched = (
+                    is_dispatched or "分發錄取" in (element.text or "") or "分發錄取" in (element.tail or "")
+                )
+
+            if not department_id:
                 continue
 
-            department_id = str(find_department_id.group(1))
-            department_name = str(apply_table_row("td:nth-child(2)").text()).strip()
-            apply_state = str(apply_table_row("td:nth-child(3)").text()).strip()
+            apply_cells = _get_cells(apply_table_row)
+            department_name = _get_text(apply_cells[1] if len(apply_cells) > 1 else None)
+            apply_state = _get_text(apply_cells[2] if len(apply_cells) > 2 else None)
 
-            person_result[admission_id][department_id] = {
-                "_name": department_name,
-                "is_dispatched": "分發錄取" in str(apply_table_row.outer_html()),
-                "apply_state": normalize_apply_state_c2e(apply_state),
-            }
+            person.applies.append(
+                ApplyRecord(
+                    department_id,
+                    department_name,
+                    *parse_chinese_apply_state(apply_state),
+                    is_dispatched=is_dispatched,
+                )
+            )
 
-        logger.info(f"Parsed data: {person_result}")
-        people_result.update(person_result)
+        logger.info(f"Parsed data: {person}")
+        people.append(person)
 
-    return people_result
+    return people
 
 
 def normalize_apply_state_c2e(chinese: str) -> str:
-    # 正取
-    if "正" in chinese:
-        order = re.search(r"(\d+)", chinese)
-        order = order.group(1) if order else "?"
-        return f"primary-{order}"
-    # 備取
-    if "備" in chinese:
-        order = re.search(r"(\d+)", chinese)
-        order = order.group(1) if order else "?"
-        return f"spare-{order}"
-    # 落榜
-    if "落" in chinese:
-        return "failed"
-    # 未知（無資料）
-    return "unknown"
+    """ex: "正取3" → "primary-3" """
+    return format_apply_state(*parse_chinese_apply_state(chinese))
 
 
 def normalize_apply_state_e2c(english: str) -> str:
-    # 正取
-    if "primary" in english:
-        state = english.split("-")
-        if state[1] == "?":
-            state[1] = ""
-        return f"正{state[1]}"
-    # 備取
-    if "spare" in english:
-        state = english.split("-")
-        if state[1] == "?":
-            state[1] = ""
-        return f"備{state[1]}"
-    # 落榜
-    if "failed" == english:
-        return "落"
-    # 尚未放榜
-    if "notYet" == english:
-        return "未放榜"
-    # WTF?
-    return "不明"
+    """ex: "primary-3" → "正3" """
+    return format_chinese_apply_state(*parse_apply_state(english))
 
 
 def can_be_int(s: Any) -> bool:
@@ -179,3 +193,15 @@ def unique(items: Iterable[_T], *, clear: bool = False) -> Generator[_T, None, N
     if clear:
         items_it = filter(None, items_it)
     yield from items_it
+
+
+def batched(items: Iterable[_T], size: int) -> Generator[list[_T], None, None]:
+    """Split items into lists of the given size. (the last one may be shorter)"""
+    batch: list[_T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import email.utils
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from .metrics import METRICS
+from .project_config import ProjectConfig
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    content: bytes
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+    """The timestamp after which the response is stale and has to be revalidated."""
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def get_validators(self) -> dict[str, str]:
+        """Get headers of a conditional request which revalidates this response."""
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    A size-bounded HTTP response cache on disk, which is shared by all years, stages and tools.
+
+    Bodies are stored gzip-compressed and evicted in LRU order. Freshness follows "Cache-Control" and "Expires",
+    and a stale response is revalidated with "ETag" and "Last-Modified", so a 304 response costs no body download.
+    """
+
+    STAT_NAMES = ("hits", "revalidated", "misses", "evictions")
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int, *, default_max_age: float = 0) -> None:
+        """
+        @param max_bytes       the max total size of (compressed) bodies
+        @param default_max_age seconds a response is fresh for if it has no freshness headers
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.default_max_age = default_max_age
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.cache_dir / "index.db", timeout=60, check_same_thread=False)
+        self.conn.executescript(
+            """
+                CREATE TABLE IF NOT EXISTS entries (
+                    url              CHAR(200)    PRIMARY KEY    NOT NULL,
+                    size             INTEGER                     NOT NULL,
+                    etag             CHAR(100),
+                    last_modified    CHAR(50),
+                    expires_at       REAL                        NOT NULL,
+                    used_at          REAL                        NOT NULL
+                );
+
+                CREATE INDEX IF NOT EXISTS entries_used_at_index
+                ON entries (used_at);
+
+                CREATE TABLE IF NOT EXISTS stats (
+                    name     CHAR(20)    PRIMARY KEY    NOT NULL,
+                    value    INTEGER                    NOT NULL
+                );
+            """
+        )
+
+        # the total size is only summed up from the index again when this estimate exceeds the limit
+        self._total_size = self.get_total_size()
+
+    def __del__(self) -> None:
+        if conn := getattr(self, "conn", None):
+            conn.close()
+
+    def get_total_size(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get_path(self, url: str) -> Path:
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.gz"
+
+    def get(self, url: str) -> CachedResponse | None:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, expires_at FROM entries WHERE url=?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+
+        try:
+            content = gzip.decompress(self.get_path(url).read_bytes())
+        except (OSError, EOFError):
+            # the body is gone or truncated, which is just a miss
+            self.delete(url)
+            return None
+
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE entries SET used_at=? WHERE url=?", (time.time(), url))
+
+        return CachedResponse(url, content, *row)
+
+    def store(self, url: str, content: bytes, headers: Mapping[str, str]) -> CachedResponse | None:
+        """Store a 200 response unless its headers forbid it."""
+        if (expires_at := self.get_expires_at(headers)) is None:
+            return None
+
+        path = self.get_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first so that a crash never leaves a truncated body,
+        # whose name is unique among threads of all processes sharing the cache directory
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(gzip.compress(content, compresslevel=6))
+        tmp_path.replace(path)
+
+        response = CachedResponse(url, content, headers.get("ETag"), headers.get("Last-Modified"), expires_at)
+        size = path.stat().st_size
+        with self._lock, self.conn:
+            self.conn.execute(
+                """
+                    INSERT OR REPLACE INTO entries (url, size, etag, last_modified, expires_at, used_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (url, size, response.etag, response.last_modified, expires_at, time.time()),
+            )
+            self._total_size += size
+
+        if self._total_size > self.max_bytes:
+            self.evict()
+
+        return response
+
+    def revalidate(self, cached: CachedResponse, headers: Mapping[str, str]) -> CachedResponse:
+        """Refresh a cached response with headers of a 304 response."""
+        cached.expires_at = self.get_expires_at(headers) or time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE entries SET expires_at=?, used_at=? WHERE url=?",
+                (cached.expires_at, time.time(), cached.url),
+            )
+        return cached
+
+    def delete(self, url: str) -> None:
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM entries WHERE url=?", (url,))
+        self.get_path(url).unlink(missing_ok=True)
+
+    def evict(self) -> None:
+        """Evict least recently used responses until the total size is within the limit."""
+        evicted: list[str] = []
+        with self._lock:
+            # other processes may have stored or evicted responses as well
+            total_size = self.get_total_size()
+            for url, size in self.conn.execute("SELECT url, size FROM entries ORDER BY used_at"):
+                if total_size <= self.max_bytes:
+                    break
+                evicted.append(url)
+                total_size -= size
+            self._total_size = total_size
+
+        for url in evicted:
+            self.delete(url)
+        self.count("evictions", len(evicted))
+
+    def clear(self) -> None:
+        with self._lock:
+            urls = [row[0] for row in self.conn.execute("SELECT url FROM entries")]
+        for url in urls:
+            self.delete(url)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM stats")
+            self._total_size = 0
+
+    def get_expires_at(self, headers: Mapping[str, str]) -> float | None:
+        """Get when a response becomes stale from its headers, or `None` if it must not be stored."""
+        now = time.time()
+        cache_control = headers.get("Cache-Control", "").lower()
+
+        if "no-store" in cache_control:
+            return None
+        if "no-cache" in cache_control:
+            return now
+        if found := re.search(r"max-age=(\d+)", cache_control):
+            return now + int(found.group(1)) - int(headers.get("Age", "0") or 0)
+        if expires := headers.get("Expires"):
+            try:
+                expires_at = email.utils.parsedate_to_datetime(expires).timestamp()
+                date_at = email.utils.parsedate_to_datetime(headers.get("Date", expires)).timestamp()
+            except (TypeError, ValueError):
+                # an invalid "Expires" means already expired
+                return now
+            # the server's clock may differ from ours
+            return now + expires_at - date_at
+
+        return now + self.default_max_age
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Count an event both in the current run metrics and in the persistent stats of the cache."""
+        if not value:
+            return
+        METRICS.inc(f"http_cache_{name}_total", value)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value=value+?",
+                (name, value, value),
+            )
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = dict.fromkeys(self.STAT_NAMES, 0)
+            stats.update(self.conn.execute("SELECT name, value FROM stats").fetchall())
+            stats["entries"], stats["bytes"] = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+
+        requests = stats["hits"] + stats["revalidated"] + stats["misses"]
+        # a revalidated response is also a hit since its body is not downloaded again
+        stats["hit_rate"] = (stats["hits"] + stats["revalidated"]) / requests if requests else 0.0
+        return stats
+
+
+_http_cache: HttpCache | None = None
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> HttpCache | None:
+    """Get the shared HTTP cache of the process, or `None` if it is disabled."""
+    global _http_cache
+
+    if not ProjectConfig.HTTP_CACHE_MAX_BYTES:
+        return None
+
+    with _http_cache_lock:
+        if _http_cache is None or _http_cache.cache_dir != ProjectConfig.get_http_cache_dir():
+            _http_cache = HttpCache(ProjectConfig.get_http_cache_dir(), ProjectConfig.HTTP_CACHE_MAX_BYTES)
+            logger.info(f"HTTP cache: {_http_cache.cache_dir}")
+        return _http_cache
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
 import argparse
+import itertools
+import json
 import sqlite3
-from collections.abc import Iterable
+from collections.abc import Generator, Iterable, Sequence
 from pathlib import Path
 from typing import Any
 
-import xlsxwriter
+from .department_resolver import DepartmentResolver
+from .metrics import METRICS
+from .name_search import split_name_query
+
+# departments matching a later rule are shown later: 清華大學 after others, and 清大電機 as the last one
+NTHU_EE_ORDER_RULES = (("清華大學", ""), ("清華大學", "電機工程"))
 
 
 class LookupDb:
@@ -22,21 +29,24 @@ class LookupDb:
 
         self.conn = sqlite3.connect(db_file)
 
-        cursor = self.conn.execute(
-            """
-                SELECT id, name
-                FROM universities
-            """
-        )
-        self.university_map = {university[0]: university[1] for university in cursor.fetchall()}
+        with METRICS.timer("lookup_db_load_seconds"):
+            cursor = self.conn.execute(
+                """
+                    SELECT id, name
+                    FROM universities
+                """
+            )
+            self.university_map = {university[0]: university[1] for university in cursor.fetchall()}
 
-        cursor = self.conn.execute(
-            """
-                SELECT id, name
-                FROM departments
-            """
-        )
-        self.department_map = {department[0]: department[1] for department in cursor.fetchall()}
+            cursor = self.conn.execute(
+                """
+                    SELECT id, name
+                    FROM departments
+                """
+            )
+            self.department_map = {department[0]: department[1] for department in cursor.fetchall()}
+
+        self.resolver = DepartmentResolver(self.university_map, self.department_map)
 
     def __del__(self) -> None:
         if self.conn:
@@ -50,33 +60,165 @@ class LookupDb:
 
         assert self.conn
         for admission_id in admission_ids:
+            METRICS.inc("lookup_queries_total", method="lookup_by_admission_ids")
+            with METRICS.timer("lookup_query_seconds", method="lookup_by_admission_ids"):
+                cursor = self.conn.execute(
+                    """
+                        SELECT department_id
+                        FROM qualified
+                        WHERE admission_id=?
+                    """,
+                    (admission_id,),
+                )
+
+                department_ids = [result[0] for result in cursor.fetchall()]
+            results[admission_id] = department_ids
+
+        return results
+
+    def lookup_by_department_ids(self, department_ids: Iterable[str]) -> dict[str, Any]:
+        assert self.conn
+        METRICS.inc("lookup_queries_total", method="lookup_by_department_ids")
+        with METRICS.timer("lookup_query_seconds", method="lookup_by_department_ids"):
             cursor = self.conn.execute(
                 """
-                    SELECT department_id
+                    SELECT admission_id
                     FROM qualified
-                    WHERE admission_id=?
-                """,
-                (admission_id,),
+                    WHERE department_id IN ({})
+                """.format("'" + "','".join(department_ids) + "'")
             )
 
-            department_ids = [result[0] for result in cursor.fetchall()]
-            results[admission_id] = department_ids
+            admission_ids = [result[0] for result in cursor.fetchall()]
 
-        return results
+        return self.lookup_by_admission_ids(admission_ids)
 
-    def lookup_by_department_ids(self, department_ids: Iterable[str]) -> dict[str, Any]:
+    def iter_query(
+        self,
+        *,
+        admission_ids: Iterable[str] = (),
+        qualified_department_ids: Iterable[str] = (),
+        university_ids: Iterable[str] | None = None,
+        department_ids: Iterable[str] | None = None,
+        exclude_department_ids: Iterable[str] = (),
+        order_rules: Sequence[tuple[str, str]] = (),
+        limit: int | None = None,
+    ) -> Generator[tuple[str, list[str]], None, None]:
+        """
+        Look up applicants with filtering, ordering and the limit done by SQL.
+
+        Applicants are ordered by admission ID, and each of them is yielded even if all departments are filtered out.
+
+        @param admission_ids            applicants of these admission IDs
+        @param qualified_department_ids and applicants who are qualified for these departments
+        @param university_ids           only show departments of these universities
+        @param department_ids           only show these departments
+        @param exclude_department_ids   do not show these departments
+        @param order_rules              `[(university name part, department name part), ...]`,
+                                        departments matching a later rule are shown later,
+                                        otherwise departments are ordered by their IDs
+        @param limit                    the max number of applicants, or `None` for all
+        @return `(admission_id, [department_id, ...])` in order
+        """
         assert self.conn
-        cursor = self.conn.execute(
-            """
-                SELECT admission_id
-                FROM qualified
-                WHERE department_id IN ({})
-            """.format("'" + "','".join(department_ids) + "'")
+
+        # lists are given as JSON so there is no limit of the number of SQL variables
+        selected_params = [json.dumps(list(admission_ids)), json.dumps(list(qualified_department_ids))]
+
+        conditions = ["q.department_id NOT IN (SELECT value FROM json_each(?))"]
+        condition_params = [json.dumps(list(exclude_department_ids))]
+        if university_ids is not None:
+            conditions.append("SUBSTR(q.department_id, 1, 3) IN (SELECT value FROM json_each(?))")
+            condition_params.append(json.dumps(list(university_ids)))
+        if department_ids is not None:
+            conditions.append("q.department_id IN (SELECT value FROM json_each(?))")
+            condition_params.append(json.dumps(list(department_ids)))
+
+        # the later rule is checked first, INSTR(name, '') is always true, and unknown names never match
+        rank_cases = " ".join(
+            f"WHEN INSTR(u.name, ?) AND INSTR(d.name, ?) THEN {rank}" for rank in range(len(order_rules), 0, -1)
         )
+        rank_expr = f"CASE {rank_cases} ELSE 0 END" if order_rules else "0"
+        rank_params = [name_part for rule in reversed(order_rules) for name_part in rule]
 
-        admission_ids = [result[0] for result in cursor.fetchall()]
+        METRICS.inc("lookup_queries_total", method="query")
+        with METRICS.timer("lookup_query_seconds", method="query"):
+            cursor = self.conn.execute(
+                f"""
+                    WITH selected AS (
+                        -- applicants who are not in the DB are yielded as well
+                        SELECT value AS admission_id FROM json_each(?)
+                        UNION
+                        SELECT admission_id FROM qualified
+                        WHERE department_id IN (SELECT value FROM json_each(?))
+                        ORDER BY admission_id
+                        LIMIT ?
+                    )
+                    SELECT DISTINCT selected.admission_id, q.department_id, {rank_expr} AS rank
+                    FROM selected
+                    LEFT JOIN qualified AS q
+                        ON q.admission_id = selected.admission_id AND {" AND ".join(conditions)}
+                    LEFT JOIN departments AS d
+                        ON d.id = q.department_id
+                    LEFT JOIN universities AS u
+                        ON u.id = SUBSTR(q.department_id, 1, 3)
+                    ORDER BY selected.admission_id, rank, q.department_id
+                """,
+                (*selected_params, -1 if limit is None else limit, *rank_params, *condition_params),
+            )
 
-        return self.lookup_by_admission_ids(admission_ids)
+        for admission_id, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+            yield admission_id, [department_id for _, department_id, _ in rows if department_id is not None]
+
+    def query(self, **kwargs: Any) -> dict[str, list[str]]:
+        """The same as `iter_query()` but returns `{"准考證號": ["系所編號", ...], ...}` in order."""
+        return dict(self.iter_query(**kwargs))
+
+    def search(self, query: str, kind: str = "departments", limit: int | None = 20) -> dict[str, str]:
+        """
+        Search departments (or universities) by a name or an abbreviation, like "清大電機" or "交大資工乙組".
+
+        @param kind  "departments" or "universities"
+        @param limit the max number of results, or `None` for all
+        @return {"011312": "國立清華大學 電機工程學系(甲組)", ...} from the best match
+        """
+        assert self.conn
+
+        METRICS.inc("lookup_queries_total", method="search")
+        with METRICS.timer("lookup_query_seconds", method="search"):
+            try:
+                aliases = dict(self.conn.execute("SELECT alias, name FROM name_aliases").fetchall())
+            except sqlite3.OperationalError:
+                raise Exception("The DB has no name index. Please rebuild it with `caac build-db`.")
+
+            conditions: list[str] = ["kind=?"]
+            params: list[Any] = [kind]
+            for alternatives in split_name_query(query, aliases):
+                # the trigram index only works for substrings of at least 3 characters
+                conditions.append(
+                    "("
+                    + " OR ".join("name LIKE ?" if len(name) >= 3 else "INSTR(name, ?)" for name in alternatives)
+                    + ")"
+                )
+                params.extend(f"%{name}%" if len(name) >= 3 else name for name in alternatives)
+
+            cursor = self.conn.execute(
+                f"""
+                    SELECT id
+                    FROM name_index
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY LENGTH(name), id
+                    LIMIT ?
+                """,
+                (*params, -1 if limit is None else limit),
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+        if kind == "universities":
+            return {university_id: self.university_map[university_id] for university_id in ids}
+        return {
+            department_id: f"{self.university_map.get(department_id[:3], '')} {self.department_map[department_id]}"
+            for department_id in ids
+        }
 
     def write_out_sieve_result(
         self,
@@ -84,6 +226,8 @@ class LookupDb:
         lookup_result: dict[str, Any],
         args: argparse.Namespace,
     ) -> None:
+        import xlsxwriter
+
         # output the results (xlsx)
         with xlsxwriter.Workbook(output_file) as wb:
             cell_format = wb.add_format({
@@ -102,8 +246,7 @@ class LookupDb:
                 applieds: list[str] = []  # ['國立臺灣大學 化學工程學系', ...]
 
                 for department_id in department_ids:
-                    university_id = department_id[:3]
-                    applieds.append(f"{self.university_map[university_id]}\n{self.department_map[department_id]}")
+                    applieds.append(self.resolver.resolve(department_id).display_name)
 
                 ws.write_row(row_num, 0, [int(admission_id), *applieds], cell_format)
 
@@ -113,30 +256,14 @@ class LookupDb:
         lookup_result: dict[str, Any],
         args: argparse.Namespace,
     ) -> None:
-        def nthu_sort(department_id: str) -> str:
-            university_id = department_id[:3]
-
-            if "清華大學" in self.university_map[university_id]:
-                if "電機工程" in self.department_map[department_id]:
-                    return "9" * 6  # 清大電機 should be the last one
-                return "9" * 3 + department_id[-3:]
-            return department_id
-
-        # list unique
-        args_department_ids = list(set(filter(None, args.department_ids.split(","))))
-
-        # let's do some post processes
-        # - we only want to show departments that are not in args.department_ids
-        # - we want 清大電機 to be shown as the last one
-        post_processed_results = {}
-        for admission_id, department_ids in lookup_result.items():
-            # remove departments which are in args.department_ids
-            department_ids = list(set(department_ids) - set(args_department_ids))
-            # put 清大電機 to the last one
-            department_ids.sort(key=nthu_sort)
-            post_processed_results[admission_id] = department_ids
-
-        self.write_out_sieve_result(output_file, post_processed_results, args)
+        """
+        The DB does these for us when the result is queried with `exclude_department_ids=args.department_ids`
+        and `order_rules=NTHU_EE_ORDER_RULES`, so the result is written out as is.
+
+        - we only want to show departments that are not in args.department_ids
+        - we want 清大電機 to be shown as the last one
+        """
+        self.write_out_sieve_result(output_file, lookup_result, args)
 
     def write_out_entrance_result(
         self,
@@ -144,6 +271,8 @@ class LookupDb:
         lookup_result: dict[str, Any],
         args: argparse.Namespace,
     ) -> None:
+        import xlsxwriter
+
         # output the results (xlsx)
         with xlsxwriter.Workbook(output_file) as wb:
             cell_format = wb.add_format({
@@ -162,7 +291,6 @@ class LookupDb:
                 applieds: list[str] = []  # ['國立臺灣大學 化學工程學系', ...]
 
                 for department_id in department_ids:
-                    university_id = department_id[:3]
-                    applieds.append(f"{self.university_map[university_id]}\n{self.department_map[department_id]}")
+                    applieds.append(self.resolver.resolve(department_id).display_name)
 
                 ws.write_row(row_num, 0, [int(admission_id), *applieds], cell_format)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import threading
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+SpanHook = Callable[[str, float, dict[str, str]], None]
+"""A callback `(metric_name, seconds, labels)` which is called whenever a timed span ends."""
+
+
+class Metrics:
+    """Counters, timings and per-item records of a run, which can be reported as JSON or Prometheus text."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.span_hooks: list[SpanHook] = []
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+            # {key: [count, sum, min, max], ...}
+            self.timings: dict[tuple[str, tuple[tuple[str, str], ...]], list[float]] = {}
+            self.records: dict[str, list[dict[str, Any]]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, Any]) -> tuple[str, tuple[tuple[str, str], ...]]:
+        return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: Any) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            if (timing := self.timings.get(key)) is None:
+                self.timings[key] = [1, seconds, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = min(timing[2], seconds)
+                timing[3] = max(timing[3], seconds)
+
+        for hook in self.span_hooks:
+            hook(name, seconds, dict(key[1]))
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Generator[None, None, None]:
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t_start, **labels)
+
+    def record(self, kind: str, **fields: Any) -> None:
+        """Keep a per-item record (e.g., one per URL), which is only included in the JSON report."""
+        with self._lock:
+            self.records.setdefault(kind, []).append(fields)
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "timings": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": int(count),
+                        "sum": total,
+                        "min": minimum,
+                        "max": maximum,
+                        "avg": total / count,
+                    }
+                    for (name, labels), (count, total, minimum, maximum) in sorted(self.timings.items())
+                ],
+                "records": {kind: list(records) for kind, records in self.records.items()},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=4, ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        def format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+        lines: list[str] = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"caac_{name}{format_labels(labels)} {value:g}")
+            for (name, labels), (count, total, _, _) in sorted(self.timings.items()):
+                lines.append(f"caac_{name}_count{format_labels(labels)} {count:g}")
+                lines.append(f"caac_{name}_sum{format_labels(labels)} {total:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, report_file: str | Path) -> None:
+        """Write the report into a file. The format is Prometheus text if the suffix is ".prom", otherwise JSON."""
+        report_file = Path(report_file)
+        report_file.parent.mkdir(parents=True, exist_ok=True)
+        content = self.to_prometheus() if report_file.suffix == ".prom" else self.to_json()
+        report_file.write_text(content, encoding="utf-8")
+        logger.info(f"Run report is written to: {report_file}")
+
+
+METRICS = Metrics()
+"""The metrics of the current process."""
+
+
+@contextmanager
+def profiled(profile_file: str | Path | None) -> Generator[None, None, None]:
+    """Profile the wrapped code with cProfile and dump stats into the file, if it is given."""
+    if not profile_file:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(profile_file))
+        logger.info(f"Profile stats are written to: {profile_file}")
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+
+from loguru import logger
+
+# common abbreviations of university and department names (abbreviation → a part of the full name)
+NAME_ALIASES: dict[str, str] = {
+    # universities
+    "臺大": "臺灣大學",
+    "師大": "臺灣師範大學",
+    "清大": "清華大學",
+    "交大": "交通大學",
+    "陽明交大": "陽明交通大學",
+    "成大": "成功大學",
+    "政大": "政治大學",
+    "中央": "中央大學",
+    "中興": "中興大學",
+    "中山": "中山大學",
+    "中正": "中正大學",
+    "北大": "臺北大學",
+    "臺科大": "臺灣科技大學",
+    "北科大": "臺北科技大學",
+    "海大": "海洋大學",
+    "彰師大": "彰化師範大學",
+    "高師大": "高雄師範大學",
+    "暨大": "暨南國際大學",
+    "東華": "東華大學",
+    "北醫": "臺北醫學大學",
+    "高醫": "高雄醫學大學",
+    "中國醫": "中國醫藥大學",
+    "輔大": "輔仁大學",
+    "東吳": "東吳大學",
+    "淡江": "淡江大學",
+    "逢甲": "逢甲大學",
+    "元智": "元智大學",
+    "中原": "中原大學",
+    "長庚": "長庚大學",
+    # departments
+    "電機": "電機工程",
+    "資工": "資訊工程",
+    "電子": "電子工程",
+    "機械": "機械工程",
+    "化工": "化學工程",
+    "土木": "土木工程",
+    "材料": "材料科學",
+    "資管": "資訊管理",
+    "企管": "企業管理",
+    "工管": "工業管理",
+    "財金": "財務金融",
+    "中文": "中國文學",
+    "外文": "外國語文",
+    "物治": "物理治療",
+    "職治": "職能治療",
+}
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a name for searching, where "台" and "臺" are the same and spaces are ignored."""
+    return re.sub(r"\s+", "", name.replace("台", "臺"))
+
+
+def split_name_query(query: str, aliases: dict[str, str]) -> list[list[str]]:
+    """
+    Split a name query into terms, each of which is a list of alternatives that a matched name contains one of.
+
+    ex: "清大電機 乙組" → [["清大", "清華大學"], ["電機", "電機工程"], ["乙組"]]
+    """
+    terms: list[list[str]] = []
+    # the longest alias goes first so that "陽明交大" is not split into "陽明" and "交大"
+    alias_pattern = "|".join(map(re.escape, sorted(aliases, key=len, reverse=True)))
+
+    for word in re.split(r"[\s,]+", query.replace("台", "臺")):
+        position = 0
+        for found in re.finditer(alias_pattern, word) if alias_pattern else ():
+            if literal := word[position : found.start()]:
+                terms.append([literal])
+            terms.append(list(dict.fromkeys((found.group(), aliases[found.group()]))))
+            position = found.end()
+        if literal := word[position:]:
+            terms.append([literal])
+
+    return terms
+
+
+def build_name_index(conn: sqlite3.Connection) -> None:
+    """Build the full-text index of university and department names, and the table of name aliases, in a DB."""
+    conn.execute(
+        """
+            CREATE TABLE IF NOT EXISTS name_aliases (
+                alias    CHAR(10)    PRIMARY KEY    NOT NULL,
+                name     CHAR(50)                   NOT NULL
+            );
+        """
+    )
+    conn.executemany("INSERT OR REPLACE INTO name_aliases (alias, name) VALUES (?, ?)", NAME_ALIASES.items())
+
+    # the index may be rebuilt after names are changed
+    conn.execute("DROP TABLE IF EXISTS name_index")
+
+    try:
+        # the trigram tokenizer makes "LIKE '%...%'" queries use the index, which works for CJK names
+        conn.execute(
+            """
+                CREATE VIRTUAL TABLE name_index
+                USING fts5(kind UNINDEXED, id UNINDEXED, name, tokenize='trigram');
+            """
+        )
+    except sqlite3.OperationalError as e:
+        # SQLite < 3.34 has no trigram tokenizer, in which case searching scans a plain table
+        logger.warning(f"Cannot create the full-text name index, use a plain table instead: {e}")
+        conn.execute("CREATE TABLE name_index (kind CHAR(20), id CHAR(7), name CHAR(150))")
+
+    conn.create_function("normalize_name", 1, normalize_name, deterministic=True)
+    conn.execute(
+        """
+            INSERT INTO name_index (kind, id, name)
+            SELECT 'universities', id, normalize_name(name)
+            FROM universities
+        """
+    )
+    # a department is indexed with its university name, so that "清大電機" matches it
+    conn.execute(
+        """
+            INSERT INTO name_index (kind, id, name)
+            SELECT
+                'departments',
+                departments.id,
+                normalize_name(COALESCE(universities.name, '') || departments.name)
+            FROM departments
+            LEFT JOIN universities ON universities.id = SUBSTR(departments.id, 1, 3)
+            WHERE LENGTH(departments.id) >= 6
+        """
+    )
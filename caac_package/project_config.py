@@ -26,7 +26,19 @@ class ProjectConfig:
     ROOT_DIR = get_script_dir().parent
     DATA_DIR = ROOT_DIR / "data"
     CRAWLER_WORKER_NUM = 8
+    CRAWL_MAX_CONCURRENCY = 16  # max requests in flight of concurrent crawls
     CRAWLED_DB_FILENAME = "sqlite3.db"
+    CRAWLED_PARTIAL_DB_FILENAME = "sqlite3.partial.db"
+    CRAWL_QUEUE_FILENAME = "queue.db"
+    CRAWL_QUEUE_VISIBILITY_TIMEOUT = 60  # in seconds
+    DB_INSERT_BATCH_SIZE = 10000
+    RELEASE_WATCH_INTERVAL = 60  # in seconds
+    RELEASE_WATCH_JITTER = 0.2  # the ratio to randomize the interval
+    HTTP_CACHE_DIRNAME = "http_cache"
+    HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 0 to disable the HTTP cache
+    CROSS_CACHE_MAX_AGE = 30 * 60  # in seconds
+    CROSS_DB_FILENAME = "cross.db"
+    FUNNEL_DB_FILENAME = "funnel.db"
 
     @classmethod
     def get_crawled_result_dir(cls, year: int, apply_stage: str) -> Path:
@@ -39,3 +51,68 @@ class ProjectConfig:
         """Get the crawled db file for a sepecific year/stage."""
         year = Year.taiwanize(year)
         return cls.get_crawled_result_dir(year, apply_stage) / cls.CRAWLED_DB_FILENAME
+
+    @classmethod
+    def get_crawled_partial_db_file(cls, year: int, apply_stage: str) -> Path:
+        """Get the db file which is built from pages of targeted departments for a sepecific year/stage."""
+        year = Year.taiwanize(year)
+        return cls.get_crawled_result_dir(year, apply_stage) / cls.CRAWLED_PARTIAL_DB_FILENAME
+
+    @classmethod
+    def get_db_changeset_dir(cls, year: int, apply_stage: str) -> Path:
+        """Get the directory of changesets between versions of the crawled db for a sepecific year/stage."""
+        year = Year.taiwanize(year)
+        return cls.get_crawled_result_dir(year, apply_stage) / "changesets"
+
+    @classmethod
+    def get_static_export_dir(cls, year: int, apply_stage: str) -> Path:
+        """Get the static JSON export directory for a sepecific year/stage."""
+        year = Year.taiwanize(year)
+        return cls.DATA_DIR / f"crawler_{year}/static_{apply_stage}"
+
+    @classmethod
+    def get_workbook_export_dir(cls, year: int, apply_stage: str) -> Path:
+        """Get the sharded workbook export directory for a sepecific year/stage."""
+        year = Year.taiwanize(year)
+        return cls.DATA_DIR / f"crawler_{year}/workbooks_{apply_stage}"
+
+    @classmethod
+    def get_crawl_queue_file(cls, year: int, apply_stage: str) -> Path:
+        """Get the shared crawl work queue file for a sepecific year/stage."""
+        year = Year.taiwanize(year)
+        return cls.get_crawled_result_dir(year, apply_stage) / cls.CRAWL_QUEUE_FILENAME
+
+    @classmethod
+    def get_http_cache_dir(cls) -> Path:
+        """Get the HTTP cache directory, which is shared by all years and stages."""
+        return cls.DATA_DIR / cls.HTTP_CACHE_DIRNAME
+
+    @classmethod
+    def get_cross_cache_dir(cls, year: int) -> Path:
+        """Get the cross-check page cache directory for a sepecific year."""
+        year = Year.taiwanize(year)
+        return cls.DATA_DIR / f"crawler_{year}/cross_cache"
+
+    @classmethod
+    def get_cross_db_file(cls, year: int) -> Path:
+        """Get the cross-check result db file for a sepecific year."""
+        year = Year.taiwanize(year)
+        return cls.DATA_DIR / f"crawler_{year}" / cls.CROSS_DB_FILENAME
+
+    @classmethod
+    def get_funnel_db_file(cls, year: int) -> Path:
+        """Get the sieve-to-entrance funnel db file for a sepecific year."""
+        year = Year.taiwanize(year)
+        return cls.DATA_DIR / f"crawler_{year}" / cls.FUNNEL_DB_FILENAME
+
+    @classmethod
+    def detect_crawled_year(cls) -> int:
+        """Detect the latest year which has been crawled from the "crawler_XXX" folders in the data directory."""
+        years = [
+            int(year_str)
+            for folder in cls.DATA_DIR.glob("crawler_*")
+            if folder.is_dir() and (year_str := folder.name.split("_")[-1]).isdigit()
+        ]
+        if not years:
+            raise FileNotFoundError("找不到以 crawler_ 開頭的資料夾！請確認 data/ 路徑下有 crawler_XXXX 的資料夾。")
+        return max(years)
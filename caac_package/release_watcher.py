@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import hashlib
+import random
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from loguru import logger
+
+from .crawler import Crawler
+from .metrics import METRICS
+from .project_config import ProjectConfig
+
+
+class ReleaseWatcher:
+    """
+    Watch the college list of a crawler until results are published (or changed),
+    and then crawl and build the DB immediately.
+
+    The college list is polled with conditional requests at a jittered interval,
+    so an unchanged page costs only a 304 response.
+    """
+
+    def __init__(
+        self,
+        crawler: Crawler,
+        *,
+        interval: float = 60,
+        jitter: float = 0.2,
+        on_ready: Callable[[Crawler, Path], None] | None = None,
+    ) -> None:
+        """
+        @param interval seconds between polls
+        @param jitter   the interval is randomized by this ratio, so watchers don't poll at the same moment
+        @param on_ready called with the crawler and its DB file once the DB is ready
+        """
+        self.crawler = crawler
+        self.interval = interval
+        self.jitter = jitter
+        self.on_ready = on_ready
+
+        self.stopped = threading.Event()
+
+        # validators of the last response
+        self._etag = ""
+        self._last_modified = ""
+
+        # the checksum of the college list which has been crawled, if any
+        self.crawled_checksum = ""
+        if (college_list_file := crawler.result_dir / "collegeList.htm").is_file():
+            self.crawled_checksum = self.get_checksum(college_list_file.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def get_checksum(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get_wait_seconds(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def poll(self) -> str | None:
+        """
+        Poll the college list once.
+
+        @return the college list if it's published and different from the crawled one, otherwise `None`
+        """
+        headers = {"User-Agent": Crawler.USER_AGENT, "Cache-Control": "no-cache"}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        METRICS.inc("release_watcher_polls_total")
+        try:
+            response = Crawler.get_scraper().get(self.crawler.college_list_url, timeout=10, headers=headers)
+        except Exception as e:
+            logger.warning(f"Failed to poll {self.crawler.college_list_url}: {e}")
+            return None
+
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            logger.info(f"Not published yet (HTTP status {response.status_code})")
+            return None
+
+        self._etag = response.headers.get("ETag", "")
+        self._last_modified = response.headers.get("Last-Modified", "")
+
+        content = response.content.decode("utf-8", errors="ignore")
+        # a placeholder page may be served before results are published
+        if not self.crawler.extract_department_list_links(content):
+            logger.info("Not published yet (no department list is found)")
+            return None
+        if self.get_checksum(content) == self.crawled_checksum:
+            return None
+
+        return content
+
+    def crawl(self, college_list: str) -> Path:
+        """
+        Crawl with the polled college list, and build the DB.
+
+        @return the DB file
+        """
+        crawler = self.crawler
+        t_start = time.perf_counter()
+
+        # previous pages are outdated, but the previous DB is still served until the new one replaces it
+        crawler.clear_pages()
+        # the polled college list is used as is, so it's not fetched again
+        crawler.write_file(crawler.result_dir / "collegeList.htm", college_list)
+
+        crawler.run()
+        self.crawled_checksum = self.get_checksum(college_list)
+
+        seconds = time.perf_counter() - t_start
+        METRICS.observe("release_watcher_crawl_seconds", seconds)
+
+        db_file = ProjectConfig.get_crawled_db_file(crawler.year, crawler.apply_stage)
+        logger.info(f"DB is ready in {seconds:.1f} seconds since the release is detected: {db_file}")
+
+        if self.on_ready:
+            self.on_ready(crawler, db_file)
+
+        return db_file
+
+    def run(self, *, once: bool = False) -> None:
+        """
+        Watch until stopped.
+
+        @param once stop after the first crawl
+        """
+        logger.info(f"Watching {self.crawler.college_list_url} every {self.interval} seconds...")
+
+        while not self.stopped.is_set():
+            if (college_list := self.poll()) is not None:
+                logger.info("The release is detected. Crawling...")
+                try:
+                    self.crawl(college_list)
+                except Exception as e:
+                    # forget the validators and the crawled checksum is not updated, so it's crawled again next time
+                    logger.exception(f"Failed to crawl the release: {e}")
+                    self._etag = self._last_modified = ""
+                else:
+                    if once:
+                        break
+
+            self.stopped.wait(self.get_wait_seconds())
@@ -0,0 +1,128 @@
+"""
+Sieve-to-entrance funnel analytics of a year.
+
+Both stage DBs are attached to a funnel DB, in which following tables are materialized in SQL:
+
+    department_flows        how many qualified applicants of a department are placed in each department (or nowhere)
+    department_funnel       qualified/placed numbers and the yield rate of each department
+    university_funnel       the same but of each university
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+from loguru import logger
+
+from .metrics import METRICS
+from .project_config import ProjectConfig
+from .year import Year
+
+
+def build_stage_funnel(year: int) -> Path:
+    """
+    Build the funnel DB of a year from its "apply_sieve" and "apply_entrance" DBs.
+
+    @return the funnel DB file
+    """
+    year = Year.taiwanize(year)
+    funnel_db_file = ProjectConfig.get_funnel_db_file(year)
+
+    stage_db_files = {
+        "sieve": ProjectConfig.get_crawled_db_file(year, "apply_sieve"),
+        "entrance": ProjectConfig.get_crawled_db_file(year, "apply_entrance"),
+    }
+    for db_file in stage_db_files.values():
+        if not db_file.is_file():
+            raise Exception(f"DB file does not exist: {db_file}")
+
+    funnel_db_file.unlink(missing_ok=True)
+    conn = sqlite3.connect(funnel_db_file)
+
+    with METRICS.timer("funnel_build_seconds"):
+        for schema, db_file in stage_db_files.items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(db_file),))
+
+        conn.executescript(
+            """
+                -- an applicant is placed in at most one department, whose NULL means not placed
+                CREATE TABLE department_flows AS
+                SELECT
+                    sieve_qualified.department_id AS from_department_id,
+                    entrance_qualified.department_id AS to_department_id,
+                    COUNT(*) AS applicant_num
+                FROM sieve.qualified AS sieve_qualified
+                LEFT JOIN entrance.qualified AS entrance_qualified
+                    ON entrance_qualified.admission_id = sieve_qualified.admission_id
+                GROUP BY from_department_id, to_department_id;
+
+                CREATE INDEX department_flows_from_index
+                ON department_flows (from_department_id);
+
+                CREATE INDEX department_flows_to_index
+                ON department_flows (to_department_id);
+
+                CREATE TABLE department_funnel AS
+                SELECT
+                    flows.department_id,
+                    COALESCE(departments.name, '') AS name,
+                    flows.qualified_num,
+                    flows.placed_here_num,
+                    flows.placed_elsewhere_num,
+                    flows.unplaced_num,
+                    COALESCE(placed.placed_num, 0) AS placed_num,
+                    ROUND(1.0 * flows.placed_here_num / flows.qualified_num, 4) AS yield_rate
+                FROM (
+                    SELECT
+                        from_department_id AS department_id,
+                        SUM(applicant_num) AS qualified_num,
+                        SUM(CASE WHEN to_department_id = from_department_id THEN applicant_num ELSE 0 END)
+                            AS placed_here_num,
+                        SUM(CASE WHEN to_department_id <> from_department_id THEN applicant_num ELSE 0 END)
+                            AS placed_elsewhere_num,
+                        SUM(CASE WHEN to_department_id IS NULL THEN applicant_num ELSE 0 END) AS unplaced_num
+                    FROM department_flows
+                    GROUP BY from_department_id
+                ) AS flows
+                LEFT JOIN sieve.departments AS departments
+                    ON departments.id = flows.department_id
+                LEFT JOIN (
+                    -- including those who are placed without a sieve result
+                    SELECT department_id, COUNT(*) AS placed_num
+                    FROM entrance.qualified
+                    GROUP BY department_id
+                ) AS placed
+                    ON placed.department_id = flows.department_id;
+
+                CREATE UNIQUE INDEX department_funnel_department_id_index
+                ON department_funnel (department_id);
+
+                CREATE TABLE university_funnel AS
+                SELECT
+                    SUBSTR(department_funnel.department_id, 1, 3) AS university_id,
+                    COALESCE(universities.name, '') AS name,
+                    SUM(qualified_num) AS qualified_num,
+                    SUM(placed_here_num) AS placed_here_num,
+                    SUM(placed_elsewhere_num) AS placed_elsewhere_num,
+                    SUM(unplaced_num) AS unplaced_num,
+                    SUM(placed_num) AS placed_num,
+                    ROUND(1.0 * SUM(placed_here_num) / SUM(qualified_num), 4) AS yield_rate
+                FROM department_funnel
+                LEFT JOIN sieve.universities AS universities
+                    ON universities.id = SUBSTR(department_funnel.department_id, 1, 3)
+                GROUP BY university_id;
+
+                CREATE UNIQUE INDEX university_funnel_university_id_index
+                ON university_funnel (university_id);
+            """
+        )
+        conn.commit()
+
+        department_num = conn.execute("SELECT COUNT(*) FROM department_funnel").fetchone()[0]
+
+    conn.close()
+
+    logger.info(f"Funnel of {department_num} departments is built: {funnel_db_file}")
+
+    return funnel_db_file
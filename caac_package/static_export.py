@@ -0,0 +1,153 @@
+"""
+Static sharded JSON export of a crawled DB, which can be served by any static file server.
+
+The exported directory looks like:
+
+    manifest.json                           points to the current version, which is written last
+    {version}/names.json                    {"universities": {id: name}, "departments": {id: name}}
+    {version}/admissions/{prefix}.json      {admission_id: [department_id, ...]} of admission IDs with the prefix
+    {version}/departments/{id}.json         {"id": ..., "name": ..., "university": ..., "admission_ids": [...]}
+
+Each JSON file has pre-compressed siblings like "*.json.gz" (and "*.json.br" if brotli is installed and wanted),
+so a client looks up an admission ID or a department with a single small request.
+"""
+
+from __future__ import annotations
+
+import datetime
+import gzip
+import itertools
+import json
+import shutil
+import sqlite3
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from loguru import logger
+
+from .metrics import METRICS
+
+STATIC_EXPORT_COMPRESSIONS = ("gzip", "br")
+STATIC_EXPORT_KEPT_VERSIONS = 2
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if compression == "br":
+        try:
+            import brotli
+        except ImportError:
+            raise Exception('Brotli compression needs the "brotli" package: pip install brotli')
+        return brotli.compress(data, quality=11)
+    raise Exception(f"Unknown compression: {compression}")
+
+
+class StaticExporter:
+    def __init__(self, output_dir: str | Path, compressions: Iterable[str] = ("gzip",)) -> None:
+        self.output_dir = Path(output_dir)
+        self.compressions = tuple(compressions)
+
+        # fail before anything is written
+        for compression in self.compressions:
+            _compress(b"", compression)
+
+        self.stats = {"files": 0, "bytes": 0, "compressed_bytes": dict.fromkeys(self.compressions, 0)}
+
+    def write_json(self, path: Path, obj: Any) -> None:
+        data = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        self.stats["files"] += 1
+        self.stats["bytes"] += len(data)
+
+        suffixes = {"gzip": ".gz", "br": ".br"}
+        for compression in self.compressions:
+            compressed = _compress(data, compression)
+            path.with_name(path.name + suffixes[compression]).write_bytes(compressed)
+            self.stats["compressed_bytes"][compression] += len(compressed)
+
+    def export(self, db_file: str | Path, *, admission_prefix_length: int = 5) -> dict[str, Any]:
+        """
+        Export the DB into a new version directory, and then switch the manifest to it.
+
+        @return the manifest
+        """
+        version = datetime.datetime.now().strftime("v%Y%m%d%H%M%S")
+        version_dir = self.output_dir / version
+
+        conn = sqlite3.connect(db_file)
+
+        with METRICS.timer("static_export_seconds"):
+            universities = dict(conn.execute("SELECT id, name FROM universities ORDER BY id").fetchall())
+            # the department list pages of universities are also parsed as "departments" with 3-digit IDs
+            departments = dict(
+                conn.execute("SELECT id, name FROM departments WHERE LENGTH(id) >= 6 ORDER BY id").fetchall()
+            )
+            self.write_json(version_dir / "names.json", {"universities": universities, "departments": departments})
+
+            # rows are streamed in order and grouped, so only one shard is in the memory at a time
+            cursor = conn.execute("SELECT admission_id, department_id FROM qualified ORDER BY admission_id, rowid")
+            admission_shard_num = 0
+            for prefix, rows in itertools.groupby(cursor, key=lambda row: row[0][:admission_prefix_length]):
+                shard: dict[str, list[str]] = {}
+                for admission_id, department_id in rows:
+                    shard.setdefault(admission_id, []).append(department_id)
+                self.write_json(version_dir / "admissions" / f"{prefix}.json", shard)
+                admission_shard_num += 1
+
+            cursor = conn.execute("SELECT department_id, admission_id FROM qualified ORDER BY department_id, rowid")
+            department_shard_num = 0
+            for department_id, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+                self.write_json(
+                    version_dir / "departments" / f"{department_id}.json",
+                    {
+                        "id": department_id,
+                        "name": departments.get(department_id, ""),
+                        "university": universities.get(department_id[:3], ""),
+                        "admission_ids": [admission_id for _, admission_id in rows],
+                    },
+                )
+                department_shard_num += 1
+
+        conn.close()
+
+        manifest = {
+            "version": version,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "compressions": list(self.compressions),
+            "names": f"{version}/names.json",
+            "admissions": {
+                "prefix_length": admission_prefix_length,
+                "path": f"{version}/admissions/{{prefix}}.json",
+                "shards": admission_shard_num,
+            },
+            "departments": {
+                "path": f"{version}/departments/{{department_id}}.json",
+                "shards": department_shard_num,
+            },
+            "stats": self.stats,
+        }
+
+        # the manifest is switched atomically, so clients never see a half-written version
+        manifest_file = self.output_dir / "manifest.json"
+        tmp_manifest_file = manifest_file.with_suffix(".tmp")
+        tmp_manifest_file.write_text(json.dumps(manifest, ensure_ascii=False, indent=4), encoding="utf-8")
+        tmp_manifest_file.replace(manifest_file)
+
+        self.prune_versions()
+
+        logger.info(
+            f"Static export {version}: {self.stats['files']} files, {self.stats['bytes']} bytes"
+            + f" ({', '.join(f'{k}: {v} bytes' for k, v in self.stats['compressed_bytes'].items())})"
+        )
+
+        return manifest
+
+    def prune_versions(self) -> None:
+        """Remove old versions, but keep a few recent ones for clients which are still reading them."""
+        versions = sorted(path for path in self.output_dir.glob("v*") if path.is_dir())
+        for version_dir in versions[:-STATIC_EXPORT_KEPT_VERSIONS]:
+            shutil.rmtree(version_dir)
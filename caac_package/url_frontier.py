@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import html
+import posixpath
+import re
+import threading
+from collections.abc import Generator
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+# href values of <a> tags, which may be double-quoted, single-quoted or unquoted
+HREF_PATTERN = re.compile(r"""<a\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+
+def canonicalize_url(url: str, base_url: str = "") -> str:
+    """
+    Canonicalize a (relative) URL, so that the same page always has the same URL.
+
+    ex: "./common//001012.htm#top" with base "https://Example.com/web/001.htm"
+        → "https://example.com/web/common/001012.htm"
+    """
+    parts = urlsplit(urljoin(base_url, url.strip()))
+    path = parts.path
+    if path:
+        # resolve "." and ".." segments and repeated slashes, but keep the trailing slash of a directory
+        normalized_path = posixpath.normpath(re.sub(r"/{2,}", "/", path))
+        if path.endswith("/") and not normalized_path.endswith("/"):
+            normalized_path += "/"
+        path = normalized_path
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def extract_links(content: str, base_url: str) -> Generator[str, None, None]:
+    """Extract canonicalized URLs of links from an HTML page with a regex scan rather than building a DOM."""
+    for found in HREF_PATTERN.finditer(content):
+        href = html.unescape(found.group(1) or found.group(2) or found.group(3) or "")
+        if href and not href.startswith(("#", "javascript:", "mailto:")):
+            yield canonicalize_url(href, base_url)
+
+
+class UrlFrontier:
+    """URLs discovered by a crawl and their states, which guarantees that a URL is only fetched once."""
+
+    STATES = ("queued", "in_flight", "done", "failed")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.states: dict[str, str] = {}
+
+    def add(self, url: str) -> bool:
+        """
+        Queue a (canonicalized) URL.
+
+        @return whether the URL is new, in which case the caller should fetch it
+        """
+        with self._lock:
+            if url in self.states:
+                return False
+            self.states[url] = "queued"
+            return True
+
+    def mark(self, url: str, state: str) -> None:
+        with self._lock:
+            self.states[url] = state
+
+    def count_states(self) -> dict[str, int]:
+        counts = dict.fromkeys(self.STATES, 0)
+        with self._lock:
+            for state in self.states.values():
+                counts[state] += 1
+        return counts
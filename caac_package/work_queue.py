@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from collections.abc import Generator, Iterable
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class WorkItem:
+    url: str
+    kind: str
+    attempts: int
+
+
+class WorkQueue:
+    """
+    A durable work queue in a SQLite file, which can be shared by worker processes on one or more hosts.
+
+    A worker leases items, and an item whose lease is not acknowledged within the visibility timeout
+    (e.g., its worker crashed) becomes visible to other workers again.
+    """
+
+    STATES = ("pending", "leased", "done", "failed")
+
+    def __init__(self, db_file: str | Path, *, visibility_timeout: float = 60, max_attempts: int = 3) -> None:
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+
+        # each thread has its own connection since a connection can't be shared between threads
+        self._thread_local = threading.local()
+
+        self._get_conn().executescript(
+            """
+                CREATE TABLE IF NOT EXISTS items (
+                    url            CHAR(200)    PRIMARY KEY    NOT NULL,
+                    kind           CHAR(20)                    NOT NULL,
+                    state          CHAR(10)                    NOT NULL,
+                    attempts       INTEGER                     NOT NULL    DEFAULT 0,
+                    lease_until    REAL,
+                    worker_id      CHAR(50)
+                );
+
+                CREATE INDEX IF NOT EXISTS items_state_index
+                ON items (state, lease_until);
+            """
+        )
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if (conn := getattr(self._thread_local, "conn", None)) is None:
+            # transactions are managed explicitly, and WAL is not used since it doesn't work on network file systems
+            conn = self._thread_local.conn = sqlite3.connect(self.db_file, timeout=60, isolation_level=None)
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = self._get_conn()
+        # "BEGIN IMMEDIATE" takes the write lock at once, so an item is never leased by two workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def put(self, urls: Iterable[str], kind: str) -> int:
+        """
+        Add URLs into the queue. URLs which have been queued before are ignored.
+
+        @return the number of newly added URLs
+        """
+        with self._transaction() as conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO items (url, kind, state) VALUES (?, ?, 'pending')",
+                ((url, kind) for url in urls),
+            )
+        return cursor.rowcount
+
+    def lease(self, worker_id: str, limit: int = 1) -> list[WorkItem]:
+        """Lease visible items, which are pending ones or those whose leases have expired."""
+        now = time.time()
+
+        with self._transaction() as conn:
+            # an item whose workers keep dying has been tried too many times
+            conn.execute(
+                "UPDATE items SET state='failed' WHERE state='leased' AND lease_until<? AND attempts>=?",
+                (now, self.max_attempts),
+            )
+            rows = conn.execute(
+                """
+                    SELECT url, kind, attempts
+                    FROM items
+                    WHERE state IN ('pending', 'leased') AND (lease_until IS NULL OR lease_until<?)
+                    LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                """
+                    UPDATE items
+                    SET state='leased', attempts=attempts+1, lease_until=?, worker_id=?
+                    WHERE url=?
+                """,
+                ((now + self.visibility_timeout, worker_id, row[0]) for row in rows),
+            )
+
+        return [WorkItem(url, kind, attempts + 1) for url, kind, attempts in rows]
+
+    def ack(self, url: str, worker_id: str) -> bool:
+        """
+        Mark an item leased by the worker as done.
+
+        @return `False` if the lease has been lost (e.g., it expired and the item was leased by another worker)
+        """
+        cursor = self._get_conn().execute(
+            "UPDATE items SET state='done', lease_until=NULL WHERE url=? AND worker_id=? AND state='leased'",
+            (url, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def nack(self, url: str, worker_id: str, delay: float = 0) -> bool:
+        """
+        Give an item leased by the worker back to the queue, which becomes visible again after the delay,
+        or mark it as failed if it has been tried too many times.
+
+        @return `False` if the lease has been lost (e.g., it expired and the item was leased by another worker)
+        """
+        cursor = self._get_conn().execute(
+            """
+                UPDATE items
+                SET state=CASE WHEN attempts>=? THEN 'failed' ELSE 'pending' END, lease_until=?
+                WHERE url=? AND worker_id=? AND state='leased'
+            """,
+            (self.max_attempts, time.time() + delay, url, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def count_states(self) -> dict[str, int]:
+        counts = dict.fromkeys(self.STATES, 0)
+        counts.update(self._get_conn().execute("SELECT state, COUNT(*) FROM items GROUP BY state").fetchall())
+        return counts
+
+    def get_failed_urls(self) -> list[str]:
+        return [row[0] for row in self._get_conn().execute("SELECT url FROM items WHERE state='failed' ORDER BY url")]
+
+    def is_finished(self) -> bool:
+        """Whether there is no pending or leased item."""
+        counts = self.count_states()
+        return counts["pending"] + counts["leased"] == 0
@@ -0,0 +1,200 @@
+"""
+Sharded workbook export of a whole crawled DB.
+
+Rather than one giant workbook, results are partitioned (by university, department or admission ID range)
+and each shard is written by a worker process. An index workbook links to all shards.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+from .functions import batched
+from .lookup_db import LookupDb
+from .metrics import METRICS
+
+WORKBOOK_EXPORT_PARTITIONS = ("university", "department", "admission")
+WORKBOOK_EXPORT_INDEX_FILENAME = "index.xlsx"
+
+
+@dataclass
+class WorkbookShard:
+    name: str  # shown in the index, like "001 國立臺灣大學"
+    filename: str  # like "university_001.xlsx"
+    # applicants who are qualified for departments with this ID prefix
+    department_id_prefix: str = ""
+    # or applicants whose admission IDs are in this range (inclusive)
+    admission_id_range: tuple[str, str] = ("", "")
+
+
+# the DB is opened once by each worker process, rather than once by each shard
+_worker_lookup: LookupDb | None = None
+
+
+def _init_worker(db_file: Path) -> None:
+    global _worker_lookup
+    _worker_lookup = LookupDb(db_file)
+
+
+def _write_shard(apply_stage: str, shard: WorkbookShard, output_dir: Path) -> int:
+    """
+    Write a shard in a worker process.
+
+    @return the number of written applicants
+    """
+    lookup = _worker_lookup
+    assert lookup and lookup.conn
+
+    # the department list pages of universities are also parsed as "departments" with 3-digit IDs
+    if prefix := shard.department_id_prefix:
+        # a range (rather than SUBSTR) is used so that the index of department IDs is used
+        if len(prefix) >= 6:
+            condition, params = "department_id = ?", (prefix,)
+        else:
+            condition, params = "department_id >= ? AND department_id < ?", (prefix, f"{prefix}\uffff")
+        cursor = lookup.conn.execute(
+            f"""
+                SELECT admission_id, department_id
+                FROM qualified
+                WHERE
+                    admission_id IN (SELECT admission_id FROM qualified WHERE {condition})
+                    AND LENGTH(department_id) >= 6
+                ORDER BY admission_id, rowid
+            """,
+            params,
+        )
+    else:
+        cursor = lookup.conn.execute(
+            """
+                SELECT admission_id, department_id
+                FROM qualified
+                WHERE admission_id BETWEEN ? AND ? AND LENGTH(department_id) >= 6
+                ORDER BY admission_id, rowid
+            """,
+            shard.admission_id_range,
+        )
+
+    results = {
+        admission_id: [department_id for _, department_id in rows]
+        for admission_id, rows in itertools.groupby(cursor, key=lambda row: row[0])
+    }
+
+    stage_name = "sieve" if apply_stage == "apply_sieve" else "entrance"
+    getattr(lookup, f"write_out_{stage_name}_result")(str(output_dir / shard.filename), results, argparse.Namespace())
+
+    return len(results)
+
+
+class ShardedWorkbookExporter:
+    def __init__(self, db_file: str | Path, apply_stage: str, output_dir: str | Path, *, worker_num: int = 0) -> None:
+        """
+        @param worker_num processes to write shards (the number of CPUs by default)
+        """
+        if not (db_file := Path(db_file)).is_file():
+            raise Exception(f"DB file does not exist: {db_file}")
+
+        self.db_file = db_file
+        self.apply_stage = apply_stage
+        self.output_dir = Path(output_dir)
+        self.worker_num = worker_num or os.cpu_count() or 1
+
+    def plan_shards(self, partition: str, *, admissions_per_shard: int = 10000) -> list[WorkbookShard]:
+        """
+        @param partition            "university", "department" or "admission"
+        @param admissions_per_shard the number of applicants in a shard of the "admission" partition
+        """
+        conn = sqlite3.connect(self.db_file)
+
+        if partition == "university":
+            shards = [
+                WorkbookShard(f"{university_id} {name}", f"university_{university_id}.xlsx", university_id)
+                for university_id, name in conn.execute("SELECT id, name FROM universities ORDER BY id")
+            ]
+        elif partition == "department":
+            university_map = dict(conn.execute("SELECT id, name FROM universities").fetchall())
+            shards = [
+                WorkbookShard(
+                    f"{department_id} {university_map.get(department_id[:3], '')} {name}",
+                    f"department_{department_id}.xlsx",
+                    department_id,
+                )
+                for department_id, name in conn.execute(
+                    "SELECT id, name FROM departments WHERE LENGTH(id) >= 6 ORDER BY id"
+                )
+            ]
+        elif partition == "admission":
+            cursor = conn.execute("SELECT DISTINCT admission_id FROM qualified ORDER BY admission_id")
+            shards = [
+                WorkbookShard(
+                    f"{admission_ids[0]} ~ {admission_ids[-1]}",
+                    f"admission_{admission_ids[0]}.xlsx",
+                    admission_id_range=(admission_ids[0], admission_ids[-1]),
+                )
+                for admission_ids in batched((row[0] for row in cursor), admissions_per_shard)
+            ]
+        else:
+            conn.close()
+            raise Exception(f"Unknown partition: {partition}")
+
+        conn.close()
+
+        return shards
+
+    def export(self, partition: str, *, admissions_per_shard: int = 10000) -> Path:
+        """
+        Write shards in parallel, and then the index workbook which links to them.
+
+        Workbooks of the previous export in the output directory are removed, but other files are kept.
+
+        @return the index workbook
+        """
+        import xlsxwriter
+
+        shards = self.plan_shards(partition, admissions_per_shard=admissions_per_shard)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.remove_old_workbooks()
+
+        with METRICS.timer("workbook_export_seconds"):
+            with ProcessPoolExecutor(
+                max_workers=self.worker_num,
+                initializer=_init_worker,
+                initargs=(self.db_file,),
+            ) as executor:
+                futures = [executor.submit(_write_shard, self.apply_stage, shard, self.output_dir) for shard in shards]
+                admission_nums = [future.result() for future in futures]
+            METRICS.inc("workbook_export_shards_total", len(shards))
+
+            index_file = self.output_dir / WORKBOOK_EXPORT_INDEX_FILENAME
+            with xlsxwriter.Workbook(str(index_file)) as wb:
+                cell_format = wb.add_format({"align": "left", "valign": "vcenter", "font_size": 9})
+                link_format = wb.add_format({"font_color": "blue", "underline": 1, "font_size": 9})
+
+                ws = wb.add_worksheet("索引")
+                ws.freeze_panes(1, 0)
+                ws.write_row(0, 0, ["分區", "檔案", "考生數"], cell_format)
+
+                for row_num, (shard, admission_num) in enumerate(zip(shards, admission_nums), 1):
+                    ws.write(row_num, 0, shard.name, cell_format)
+                    ws.write_url(row_num, 1, f"external:{shard.filename}", link_format, string=shard.filename)
+                    ws.write(row_num, 2, admission_num, cell_format)
+
+        logger.info(f"{len(shards)} workbooks ({partition}) are exported by {self.worker_num} workers: {index_file}")
+
+        return index_file
+
+    def remove_old_workbooks(self) -> None:
+        """Remove workbooks written by a previous export, whose names are like "university_001.xlsx"."""
+        old_files = [self.output_dir / WORKBOOK_EXPORT_INDEX_FILENAME]
+        for partition in WORKBOOK_EXPORT_PARTITIONS:
+            old_files.extend(self.output_dir.glob(f"{partition}_*.xlsx"))
+        for old_file in old_files:
+            old_file.unlink(missing_ok=True)